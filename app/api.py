@@ -1,27 +1,58 @@
+import json
 from contextlib import asynccontextmanager
+from datetime import date, datetime
 from typing import Optional, Annotated, cast
 from uuid import UUID
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session
-from fastapi import FastAPI, Depends, HTTPException, Query, status, exceptions
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status, exceptions
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from decouple import config
 
-from app.handlers import client_handler, vehicle_handler, repair_handler, mechanic_handler
+from app.handlers import client_handler, vehicle_handler, repair_handler, mechanic_handler, report_handler
+from app.handlers import notification_handler # registra los job handlers
 from app.db import *
 from app.schemas.client import *
 from app.schemas.vehicle import *
 from app.schemas.repairs import *
 from app.schemas.mechanic import *
-from app.auth.auth_handler import TokenResponse, get_current_mechanic, sign_jwt
+from app.schemas.report import *
+from app.schemas.history import VehicleHistory
+from app.schemas.batch import BatchGet, BatchItem
+from app.schemas.profiling import ProfileInfo, ProfilingSettings
+from app.auth.refresh import create_refresh_token, rotate_refresh_token
+from app.auth.auth_handler import RefreshRequest, TokenResponse, authenticate_token, get_current_admin, get_current_mechanic, oauth2_scheme, sign_jwt
+from app.middleware.admission import AdmissionControlMiddleware, admission_stats
+from app.middleware.compression import CompressionMiddleware
+from app.middleware import profiling
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.fields import sparse_fields, sparse_response
+from app.cache import entity_cache
+from app.jobs import JobWorkerPool
+from app.events import repair_events
+from app.maintenance import maintenance
 
 # esto deberia ejecutarse antes de que la app empieze a recibir requests
 # es decir, lo primero que quiero hacer es crear la base de datos
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    # workers que procesan la tabla outbox (notificaciones, etc.) fuera del request
+    job_pool = JobWorkerPool(engine)
+    await job_pool.start()
+    await repair_events.start(engine)
+    await maintenance.start()
     yield
+    await maintenance.stop()
+    await repair_events.stop()
+    await job_pool.stop()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(profiling.ProfilingMiddleware)
+# la compresión queda adentro del control de admisión, así su cpu también está acotada
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(IdempotencyMiddleware)
 
 # endpoints
 
@@ -39,6 +70,7 @@ def create_mechanic(session: Annotated[Session, Depends(get_session)], mechanic_
     return {
         "access_token": token,
         "token_type": "bearer",
+        "refresh_token": create_refresh_token(session, mechanic.id),
         "mechanic": mechanic
     }
 
@@ -54,6 +86,24 @@ async def mechanic_login(session: Annotated[Session, Depends(get_session)], form
     return {
         "access_token": token,
         "token_type": "bearer",
+        "refresh_token": create_refresh_token(session, mechanic.id),
+        "mechanic": mechanic
+    }
+
+@app.post("/mechanic/refresh", tags=["Mechanics"], description="New access token (and a new refresh token) without the password",
+          response_model=TokenResponse, status_code=status.HTTP_200_OK)
+async def refresh_access_token(session: Annotated[Session, Depends(get_session)], refresh: RefreshRequest):
+    rotated = rotate_refresh_token(session, refresh.refresh_token)
+    if not rotated:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid refresh token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    mechanic, refresh_token = rotated
+
+    return {
+        "access_token": sign_jwt(mechanic),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
         "mechanic": mechanic
     }
 
@@ -61,6 +111,20 @@ async def mechanic_login(session: Annotated[Session, Depends(get_session)], form
 async def read_mechanics_me(current_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)]):
     return current_mechanic
 
+@app.get("/mechanics/availability", tags=["Mechanics"], description="Mechanics with no repair overlapping the given range",
+         response_model=list[MechanicRead], status_code=status.HTTP_200_OK)
+async def get_mechanics_availability(
+    session: Annotated[Session, Depends(get_session)],
+    auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    start: Annotated[datetime, Query(alias="from")],
+    finish: Annotated[datetime, Query(alias="to")],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(MechanicRead))]
+):
+    if finish <= start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must be after 'from'")
+    mechanics = await mechanic_handler.get_available_mechanics(session, start, finish, fields)
+    return sparse_response(mechanics, MechanicRead, fields)
+
 @app.get("/mechanic/{mechanic_id}", tags=["Mechanics"], response_model=MechanicRead, status_code=status.HTTP_200_OK)
 async def search_mechanic_by_id(session: Annotated[Session, Depends(get_session)],
                                 auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
@@ -72,14 +136,23 @@ async def search_mechanic_by_id(session: Annotated[Session, Depends(get_session)
 
     return mechanic_data
     
+@app.post("/mechanics/batch-get", tags=["Mechanics"], description="Get many mechanics by id in one request, in request order",
+          response_model=list[BatchItem[MechanicRead]], status_code=status.HTTP_200_OK)
+async def batch_get_mechanics(session: Annotated[Session, Depends(get_session)],
+                              auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+                              batch: BatchGet
+):
+    return await mechanic_handler.get_mechanics_data(session, batch.ids)
+
 @app.get("/mechanic/", tags=["Mechanics"], response_model=list[MechanicRead], status_code=status.HTTP_200_OK)
 async def list_or_search_mechanics(
     session: Annotated[Session, Depends(get_session)],
     auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(MechanicRead))],
     q: Annotated[str | None, Query(min_length=2, description="Nombre del mecánico")] = None
 ):
-    mechanic =  await mechanic_handler.search_mechanics(session, q)
-    return mechanic
+    mechanic =  await mechanic_handler.search_mechanics(session, q, fields)
+    return sparse_response(mechanic, MechanicRead, fields)
 
 @app.patch("/mechanic/{mechanic_id}", tags=["Mechanics"], response_model=MechanicRead, status_code=status.HTTP_200_OK)
 async def update_mechanic_data(
@@ -130,16 +203,25 @@ async def search_client_by_id(session: Annotated[Session, Depends(get_session)],
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
        
+@app.post("/clients/batch-get", tags=["Clients"], description="Get many clients by id in one request, in request order",
+          response_model=list[BatchItem[ClientRead]], status_code=status.HTTP_200_OK)
+async def batch_get_clients(session: Annotated[Session, Depends(get_session)],
+                            auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+                            batch: BatchGet
+):
+    return await client_handler.get_clients_data(session, batch.ids)
+
 @app.get("/clients/", tags=["Clients"], response_model=list[ClientRead], status_code=status.HTTP_200_OK)
 async def list_or_search_clients(
     session: Annotated[Session, Depends(get_session)],
     auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(ClientRead))],
     q: Annotated[str | None, Query(min_length=2, description="Nombre del cliente")] = None,
     limit: int = Query(20, le=100)
 ):
     try:
-        clients = await client_handler.search_clients(session, q, limit)
-        return clients
+        clients = await client_handler.search_clients(session, q, limit, fields)
+        return sparse_response(clients, ClientRead, fields)
     except ValueError as e:
         raise HTTPException(status_code=500, detail=f"Datos inválidos: {str(e)}")
     except Exception as e:
@@ -180,6 +262,18 @@ def create_vehicle_for_client(
 ):
     return save_vehicle_in_db(session, vehicle_data, client_id)
 
+@app.get("/vehicles/suggest", tags=["Vehicles"], description="License plate typeahead, ignores case, spaces and dashes",
+         response_model=list[VehicleRead], status_code=status.HTTP_200_OK)
+async def suggest_vehicles_by_plate(
+    session: Annotated[Session, Depends(get_session)],
+    auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    prefix: Annotated[str, Query(min_length=1, description="Comienzo de la patente")],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(VehicleRead))],
+    limit: int = Query(10, le=50)
+):
+    vehicles = await vehicle_handler.suggest_vehicles(session, prefix, limit, fields)
+    return sparse_response(vehicles, VehicleRead, fields)
+
 @app.get(
     "/vehicles/{vehicle_id}", tags=["Vehicles"], response_model=VehicleRead, 
     status_code=status.HTTP_200_OK
@@ -190,10 +284,20 @@ async def search_vehicle_by_id(session: Annotated[Session, Depends(get_session)]
 ):
     try:
         vehicles_list = await vehicle_handler.get_vehicle_data(session, vehicle_id)
-        return vehicles_list
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if vehicles_list is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found")
+    return vehicles_list
     
+@app.post("/vehicles/batch-get", tags=["Vehicles"], description="Get many vehicles by id in one request, in request order",
+          response_model=list[BatchItem[VehicleRead]], status_code=status.HTTP_200_OK)
+async def batch_get_vehicles(session: Annotated[Session, Depends(get_session)],
+                             auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+                             batch: BatchGet
+):
+    return await vehicle_handler.get_vehicles_data(session, batch.ids)
+
 @app.get(
     "/vehicles/", tags=["Vehicles"], response_model=list[VehicleRead], 
     status_code=status.HTTP_200_OK
@@ -201,13 +305,14 @@ async def search_vehicle_by_id(session: Annotated[Session, Depends(get_session)]
 async def search_or_list_vehicles(
     session: Annotated[Session, Depends(get_session)],
     auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(VehicleRead))],
     q: Annotated[str | None, Query(min_length=2, description="Nombre del cliente")] = None,
     license_plate: Annotated[str | None, Query(min_length=3, description="Patente")] = None,
     limit: int = Query(20, le=100)
 ):
     try:
-        vehicle_data = await vehicle_handler.search_vehicles(session, q, license_plate, limit)
-        return vehicle_data
+        vehicle_data = await vehicle_handler.search_vehicles(session, q, license_plate, limit, fields)
+        return sparse_response(vehicle_data, VehicleRead, fields)
     except exceptions.ResponseValidationError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -215,10 +320,11 @@ async def search_or_list_vehicles(
 async def get_vehicles_of_client(
     session: Annotated[Session, Depends(get_session)],
     auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
-    client_id: UUID
+    client_id: UUID,
+    fields: Annotated[list[str] | None, Depends(sparse_fields(VehicleRead))]
 ):
-    vehicles_of_client = await vehicle_handler.get_client_vehicles(session, client_id)
-    return vehicles_of_client
+    vehicles_of_client = await vehicle_handler.get_client_vehicles(session, client_id, fields)
+    return sparse_response(vehicles_of_client, VehicleRead, fields)
 
 @app.patch("/vehicles/{vehicle_id}", tags=["Vehicles"], response_model=VehicleRead, status_code=status.HTTP_200_OK)
 async def update_vehicle_data(
@@ -264,22 +370,33 @@ async def search_repair_by_id(session: Annotated[Session, Depends(get_session)],
 ):
     try:
         repair_data = await repair_handler.get_repair_data(session, repair_id)
-        return repair_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if repair_data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Repair not found")
+    return repair_data
     
+@app.post("/repairs/batch-get", tags=["Repairs"], description="Get many repairs by id in one request, in request order",
+          response_model=list[BatchItem[RepairsRead]], status_code=status.HTTP_200_OK)
+async def batch_get_repairs(session: Annotated[Session, Depends(get_session)],
+                            auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+                            batch: BatchGet
+):
+    return await repair_handler.get_repairs_data(session, batch.ids)
+
 @app.get("/repairs/", tags=["Repairs"], response_model=list[RepairsRead], status_code=status.HTTP_200_OK)
 async def search_or_list_repairs(
     session: Annotated[Session, Depends(get_session)],
     auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(RepairsRead))],
     license_plate: Annotated[str | None, Query(min_length=3, description="License plate")] = None,
     client_name: Annotated[str | None, Query(min_length=2, description="Client name")] = None,
     status: Annotated[RepairStatus | None, Query(description="Repair status")] = None,
     limit: int = Query(20, le=100)
 ):
     try:
-        repairs = await repair_handler.search_repairs(session, license_plate, client_name, status, limit)
-        return repairs
+        repairs = await repair_handler.search_repairs(session, license_plate, client_name, status, limit, fields)
+        return sparse_response(repairs, RepairsRead, fields)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -287,20 +404,85 @@ async def search_or_list_repairs(
          response_model=list[RepairsRead], status_code=status.HTTP_200_OK)
 async def get_repairs_record(session: Annotated[Session, Depends(get_session)], 
                              auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
-                             vehicle_id: UUID
+                             vehicle_id: UUID,
+                             fields: Annotated[list[str] | None, Depends(sparse_fields(RepairsRead))],
+                             include_archived: Annotated[bool, Query(description="Include archived (old delivered) repairs")] = False
+):
+    vehicle_repairs = await repair_handler.get_record_of_repairs(session, vehicle_id, include_archived, fields)
+    return sparse_response(vehicle_repairs, RepairsRead, fields)
+
+@app.get("/vehicles/{vehicle_id}/history", tags=["Repairs"], description="Vehicle, owner and every repair with its mechanic and status timeline",
+         response_model=VehicleHistory, status_code=status.HTTP_200_OK)
+async def get_vehicle_history(session: Annotated[Session, Depends(get_session)], 
+                              auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+                              vehicle_id: UUID
 ):
-    vehicle_repairs = await repair_handler.get_record_of_repairs(session, vehicle_id)
-    return vehicle_repairs
+    document = await vehicle_handler.get_vehicle_history(session, vehicle_id)
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found")
+    # el documento ya está serializado, se devuelve tal cual sin volver a validarlo
+    return Response(content=document, media_type="application/json")
 
 @app.get("/mechanics/{mechanic_id}/repairs/", tags=["Repairs"], description="Get repairs assigned to a mechanic",
          response_model=list[RepairsRead], status_code=status.HTTP_200_OK)
 async def get_repairs_mechanic(session: Annotated[Session, Depends(get_session)], 
                              auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
-                             mechanic_id: UUID
+                             mechanic_id: UUID,
+                             fields: Annotated[list[str] | None, Depends(sparse_fields(RepairsRead))],
+                             include_archived: Annotated[bool, Query(description="Include archived (old delivered) repairs")] = False
+):
+    mechanic_repairs = await repair_handler.get_mechanic_repairs(session, mechanic_id, include_archived, fields)
+    return sparse_response(mechanic_repairs, RepairsRead, fields)
+
+
+@app.websocket("/ws/repairs")
+async def repairs_feed_ws(
+    websocket: WebSocket,
+    token: str,
+    mechanic_id: UUID | None = None,
+    status_filter: Annotated[list[RepairStatus] | None, Query(alias="status")] = None,
+    last_event_id: int | None = None
+):
+    if not authenticate_token(token):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    statuses = {s.value for s in status_filter} if status_filter else None
+    subscription = await repair_events.subscribe(mechanic_id, statuses, last_event_id)
+    try:
+        async for event in repair_events.listen(subscription):
+            await websocket.send_json(event or {"type": "heartbeat"})
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Send buffer full, reconnect with last_event_id")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        repair_events.unsubscribe(subscription)
+
+@app.get("/sse/repairs", tags=["Repairs"], description="Server-sent events with repair changes (created, updated, deleted)")
+async def repairs_feed_sse(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    mechanic_id: UUID | None = None,
+    status_filter: Annotated[list[RepairStatus] | None, Query(alias="status")] = None,
+    last_event_id: Annotated[int | None, Header(alias="Last-Event-ID")] = None
 ):
-    mechanic_repairs = await repair_handler.get_mechanic_repairs(session, mechanic_id)
-    return mechanic_repairs
+    if not authenticate_token(token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
 
+    statuses = {s.value for s in status_filter} if status_filter else None
+    subscription = await repair_events.subscribe(mechanic_id, statuses, last_event_id)
+
+    async def stream():
+        try:
+            async for event in repair_events.listen(subscription):
+                if event is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            repair_events.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.patch("/repairs/{repair_id}", tags=["Repairs"], response_model=RepairsRead, status_code=status.HTTP_200_OK)
 async def update_repair_info(session: Annotated[Session, Depends(get_session)], 
@@ -324,4 +506,74 @@ async def soft_delete_repair(
     try:
         await repair_handler.delete_repair(session, repair_id) 
     except Exception:
-        raise HTTPException(status_code=500, detail="Error borrando datos")     
+        raise HTTPException(status_code=500, detail="Error borrando datos")
+
+# ============= REPORTS =============
+
+@app.get("/reports/repairs", tags=["Reports"], description="Repairs opened, finished and delivered per period",
+         response_model=list[RepairReportRow], status_code=status.HTTP_200_OK)
+async def get_repairs_report(
+    session: Annotated[Session, Depends(get_session)],
+    auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)],
+    start: Annotated[date, Query(alias="from")],
+    finish: Annotated[date, Query(alias="to")],
+    granularity: Granularity = Granularity.day,
+    group_by: Annotated[ReportGroup | None, Query(description="mechanic | brand")] = None
+):
+    if finish < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' must be after 'from'")
+    return await report_handler.get_repair_report(session, granularity, start, finish, group_by)
+
+# ============= METRICS =============
+
+@app.get("/metrics/admission", tags=["Metrics"], status_code=status.HTTP_200_OK)
+async def get_admission_metrics(auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)]):
+    return admission_stats()
+
+@app.get("/metrics/cache", tags=["Metrics"], status_code=status.HTTP_200_OK)
+async def get_cache_metrics(auth_mechanic: Annotated[Mechanic, Depends(get_current_mechanic)]):
+    return entity_cache.stats()
+
+# ============= ADMIN =============
+
+@app.get("/admin/maintenance", tags=["Admin"], description="Last run status and timings of the database maintenance tasks",
+         status_code=status.HTTP_200_OK)
+async def get_maintenance_status(admin: Annotated[Mechanic, Depends(get_current_admin)]):
+    return maintenance.status()
+
+@app.post("/admin/maintenance/{task_name}", tags=["Admin"], description="Run a maintenance task now",
+          status_code=status.HTTP_200_OK)
+async def run_maintenance_task(admin: Annotated[Mechanic, Depends(get_current_admin)], task_name: str):
+    if task_name not in maintenance.tasks:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Maintenance task not found")
+    return await maintenance.run(task_name)
+
+@app.get("/admin/profiling", tags=["Admin"], response_model=ProfilingSettings, status_code=status.HTTP_200_OK)
+async def get_profiling_settings(admin: Annotated[Mechanic, Depends(get_current_admin)]):
+    return profiling.settings
+
+@app.put("/admin/profiling", tags=["Admin"], response_model=ProfilingSettings, status_code=status.HTTP_200_OK,
+         description="Turn request profiling on or off for this worker (requests with 'X-Profile: 1' from an admin, or sampled)")
+async def update_profiling_settings(admin: Annotated[Mechanic, Depends(get_current_admin)], update: ProfilingSettings):
+    profiling.settings.update(update.model_dump())
+    return profiling.settings
+
+@app.get("/admin/profiles", tags=["Admin"], response_model=list[ProfileInfo], status_code=status.HTTP_200_OK)
+async def list_request_profiles(admin: Annotated[Mechanic, Depends(get_current_admin)],
+                                route: Annotated[str | None, Query(description="Route template, e.g. /vehicles/{vehicle_id}")] = None
+):
+    return profiling.list_profiles(route)
+
+@app.get("/admin/profiles/{profile_id}", tags=["Admin"], status_code=status.HTTP_200_OK,
+         description="pstats file (open with pstats or snakeviz), or format=text for the top functions by cumulative time")
+async def download_request_profile(admin: Annotated[Mechanic, Depends(get_current_admin)],
+                                   profile_id: str,
+                                   format: Annotated[str, Query(pattern="^(prof|text)$")] = "prof"
+):
+    path = profiling.profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(profiling.profile_text(path))
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
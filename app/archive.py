@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from typing import cast
+from decouple import config
+from sqlalchemy import Engine, literal
+from sqlmodel import Session, SQLModel, select, delete, insert, col, or_
+
+from app.models import Client, Vehicle, Repairs, ClientArchive, VehicleArchive, RepairsArchive, VehicleHistorySnapshot
+from app.schemas.repairs import RepairStatus
+from app.intervals import repair_interval, repairs_rowid
+from app.cache import entity_cache, cache_key
+
+# mueve a las tablas *Archive las filas que ya no se usan en el día a día:
+#  - reparaciones borradas o entregadas hace más de ARCHIVE_DELIVERED_AFTER_DAYS
+#  - vehículos borrados que ya no tienen reparaciones en la tabla principal
+#  - clientes borrados que ya no tienen vehículos en la tabla principal
+# trabaja de a lotes chicos para no tener el lock de escritura mucho tiempo.
+# se puede correr a mano con: python -m app.archive
+
+ARCHIVE_DELIVERED_AFTER_DAYS = cast(int, config("ARCHIVE_DELIVERED_AFTER_DAYS", default=365, cast=int))
+ARCHIVE_BATCH_SIZE = cast(int, config("ARCHIVE_BATCH_SIZE", default=500, cast=int))
+
+def move_rows(session: Session, model: type[SQLModel], archive: type[SQLModel], ids: list, now: datetime):
+    columns = [column.name for column in model.__table__.columns] # type: ignore
+    source = select(*[model.__table__.c[name] for name in columns], literal(now, archive.__table__.c.archived_at.type)) # type: ignore
+    session.execute(insert(archive).from_select([*columns, "archived_at"], source.where(model.__table__.c.id.in_(ids)))) # type: ignore
+    session.execute(delete(model).where(model.__table__.c.id.in_(ids))) # type: ignore
+
+def archive_batch(session: Session, model: type[SQLModel], archive: type[SQLModel], entity: str, condition) -> int:
+    ids = list(session.exec(select(model.__table__.c.id).where(condition).limit(ARCHIVE_BATCH_SIZE)).all()) # type: ignore
+    if not ids:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    if model is Repairs:
+        # las entregadas todavía están en el índice de intervalos
+        rowids = select(repairs_rowid).where(col(Repairs.id).in_(ids))
+        session.execute(delete(repair_interval).where(repair_interval.c.id.in_(rowids)))
+    if model is Vehicle:
+        session.execute(delete(VehicleHistorySnapshot).where(col(VehicleHistorySnapshot.vehicle_id).in_(ids)))
+
+    move_rows(session, model, archive, ids, now)
+    session.commit()
+
+    for entity_id in ids:
+        entity_cache.delete(cache_key(entity, entity_id))
+    return len(ids)
+
+def archive_cold_rows(engine: Engine, max_batches: int | None = None) -> dict[str, int]:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_DELIVERED_AFTER_DAYS)
+    hot_repairs = select(Repairs.id).where(Repairs.vehicle_id==Vehicle.id).exists()
+    hot_vehicles = select(Vehicle.id).where(Vehicle.client_id==Client.id).exists()
+    steps = [
+        ("repair", Repairs, RepairsArchive, or_(
+            col(Repairs.deleted_at).is_not(None),
+            (col(Repairs.status)==RepairStatus.entregado) & (col(Repairs.finish_date) < cutoff)
+        )),
+        ("vehicle", Vehicle, VehicleArchive, col(Vehicle.deleted_at).is_not(None) & ~hot_repairs),
+        ("client", Client, ClientArchive, col(Client.deleted_at).is_not(None) & ~hot_vehicles),
+    ]
+
+    moved = {entity: 0 for entity, *_ in steps}
+    batches = 0
+    with Session(engine) as session:
+        for entity, model, archive, condition in steps:
+            while max_batches is None or batches < max_batches:
+                count = archive_batch(session, model, archive, entity, condition)
+                batches += 1
+                moved[entity] += count
+                if count < ARCHIVE_BATCH_SIZE:
+                    break
+    return moved
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    create_db_and_tables()
+    print(archive_cold_rows(engine))
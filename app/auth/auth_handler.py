@@ -10,16 +10,22 @@ from app.models import Mechanic
 from app.schemas.mechanic import MechanicRead
 import jwt
 from decouple import config
-from app.db import get_session
+from app.db import get_session, engine
 
 JWT_SECRET = cast(str, config("secret"))
 JWT_ALGORITHM = cast(str, config("algorithm"))
+# mails de los mecánicos con acceso a los endpoints /admin, separados por coma
+ADMIN_EMAILS = {email.strip().lower() for email in cast(str, config("ADMIN_EMAILS", default="")).split(",") if email.strip()}
 
 class TokenResponse(BaseModel): 
     access_token: str
     token_type: str
+    refresh_token: str
     mechanic: MechanicRead
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/mechanic/login")
 
 def token_response(token: str):
@@ -65,6 +71,24 @@ async def get_current_mechanic(session: Annotated[Session, Depends(get_session)]
         raise credentials_exception
     return mechanic
 
+async def get_current_admin(mechanic: Annotated[Mechanic, Depends(get_current_mechanic)]) -> Mechanic:
+    if mechanic.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return mechanic
+
+# para conexiones largas (websocket / sse): usa una sesión propia y la cierra enseguida,
+# así la conexión no se queda con una conexión del pool mientras está abierta
+def authenticate_token(token: str) -> Mechanic | None:
+    payload = decode_jwt(token)
+    if not payload:
+        return None
+
+    with Session(engine) as session:
+        mechanic = session.exec(select(Mechanic).where(Mechanic.id==UUID(payload["sub"]))).one_or_none()
+    if not mechanic or mechanic.deleted_at is not None:
+        return None
+    return mechanic
+
 
 
 
@@ -0,0 +1,89 @@
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import cast
+from uuid import UUID, uuid4
+
+from decouple import config
+from sqlalchemy import Engine
+from sqlmodel import Session, select, update, delete, col
+
+from app.models import Mechanic, RefreshToken
+from app.auth.security import hash_token
+
+REFRESH_TOKEN_DAYS = cast(int, config("REFRESH_TOKEN_DAYS", default=30, cast=int))
+
+# refresh tokens opacos y rotativos: cada uso devuelve uno nuevo de la misma familia y marca
+# el anterior como reemplazado. Si llega uno ya reemplazado es que alguien lo copió, y se
+# revoca toda la familia. En la base se guarda solo el hash
+
+def issue_refresh_token(session: Session, mechanic_id: UUID, family_id: UUID | None = None) -> tuple[str, RefreshToken]:
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    refresh = RefreshToken(
+        token_hash=hash_token(token),
+        family_id=family_id or uuid4(),
+        mechanic_id=mechanic_id,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_DAYS)
+    )
+    session.add(refresh)
+    return token, refresh
+
+def create_refresh_token(session: Session, mechanic_id: UUID) -> str:
+    token, _ = issue_refresh_token(session, mechanic_id)
+    session.commit()
+    return token
+
+def rotate_refresh_token(session: Session, token: str) -> tuple[Mechanic, str] | None:
+    now = datetime.now(timezone.utc)
+    row = session.exec(
+        select(RefreshToken, Mechanic)
+        .join(Mechanic, col(Mechanic.id)==RefreshToken.mechanic_id)
+        .where(RefreshToken.token_hash==hash_token(token), col(RefreshToken.expires_at) > now)
+    ).one_or_none()
+    if not row:
+        return None
+
+    current, mechanic = row
+    if current.revoked_at is not None:
+        revoke_family(session, current.family_id)
+        session.commit()
+        return None
+    if mechanic.deleted_at is not None:
+        return None
+    # fuera de la sesión, así el commit no lo expira y no hace falta volver a leerlo
+    session.expunge(mechanic)
+
+    new_token, new_refresh = issue_refresh_token(session, mechanic.id, current.family_id)
+    # condicional: si dos requests rotan el mismo token a la vez, solo uno gana
+    result = session.execute(
+        update(RefreshToken)
+        .where(col(RefreshToken.id)==current.id, col(RefreshToken.revoked_at).is_(None))
+        .values(revoked_at=now, replaced_by=new_refresh.id)
+    )
+    if result.rowcount == 0: # type: ignore
+        session.rollback()
+        return None
+    session.commit()
+    return mechanic, new_token
+
+def revoke_family(session: Session, family_id: UUID):
+    session.execute(
+        update(RefreshToken)
+        .where(col(RefreshToken.family_id)==family_id, col(RefreshToken.revoked_at).is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+def revoke_refresh_tokens(session: Session, mechanic_id: UUID):
+    # no hace commit, va en la misma transacción que el cambio del mecánico
+    session.execute(
+        update(RefreshToken)
+        .where(col(RefreshToken.mechanic_id)==mechanic_id, col(RefreshToken.revoked_at).is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+def prune_refresh_tokens(engine: Engine) -> dict:
+    with Session(engine) as session:
+        result = session.execute(delete(RefreshToken).where(col(RefreshToken.expires_at) < datetime.now(timezone.utc)))
+        session.commit()
+    return {"deleted": result.rowcount} # type: ignore
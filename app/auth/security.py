@@ -1,3 +1,4 @@
+import hashlib
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -7,3 +8,7 @@ def hash_pwd(password: str) -> str:
 
 def verify_pwd(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+def hash_token(token: str) -> str:
+    # los refresh tokens son aleatorios y largos, alcanza con sha256 (bcrypt sería tirar cpu)
+    return hashlib.sha256(token.encode()).hexdigest()
@@ -0,0 +1,40 @@
+from typing import Sequence
+from uuid import UUID
+from pydantic import BaseModel
+from sqlmodel import Session, SQLModel, select
+
+from app.cache import entity_cache, cache_key
+from app.schemas.batch import BatchItem
+
+# sqlite < 3.32 acepta como máximo 999 parámetros por consulta
+BATCH_CHUNK_SIZE = 500
+
+def batch_get(
+        session: Session, model: type[SQLModel], schema: type[BaseModel], entity: str, ids: Sequence[UUID],
+        archive: type[SQLModel] | None = None
+) -> list[BatchItem]:
+    # mismo criterio que los GET por id: primero la caché, lo que falta en un solo IN por tramo
+    found: dict[UUID, BaseModel] = {}
+    missing: list[UUID] = []
+    for entity_id in dict.fromkeys(ids):
+        cached = entity_cache.get(cache_key(entity, entity_id))
+        if cached is not None:
+            found[entity_id] = cached
+        else:
+            missing.append(entity_id)
+
+    # lo que no está en la tabla principal se busca en el archivo, si la entidad tiene uno
+    for table in (model, archive):
+        missing = [entity_id for entity_id in missing if entity_id not in found]
+        if table is None or not missing:
+            continue
+        id_column = table.__table__.c.id # type: ignore
+        for start in range(0, len(missing), BATCH_CHUNK_SIZE):
+            chunk = missing[start:start + BATCH_CHUNK_SIZE]
+            for row in session.exec(select(table).where(id_column.in_(chunk))).all():
+                data = schema.model_validate(row)
+                found[row.id] = data # type: ignore
+                entity_cache.set(cache_key(entity, row.id), data) # type: ignore
+
+    # en el orden pedido, con found=False para los que no existen
+    return [BatchItem(id=entity_id, found=entity_id in found, data=found.get(entity_id)) for entity_id in ids]
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, cast
+from uuid import UUID, uuid4
+
+from decouple import config
+
+CACHE_BACKEND = cast(str, config("ENTITY_CACHE_BACKEND", default="memory"))
+CACHE_MAX_SIZE = cast(int, config("ENTITY_CACHE_MAX_SIZE", default=10000, cast=int))
+CACHE_TTL = cast(float, config("ENTITY_CACHE_TTL", default=60.0, cast=float))
+CACHE_SHARED_PATH = cast(str, config("ENTITY_CACHE_SHARED_PATH", default="cache.db"))
+CACHE_SYNC_INTERVAL = cast(float, config("ENTITY_CACHE_SYNC_INTERVAL", default=0.5, cast=float))
+
+def cache_key(entity: str, entity_id: UUID) -> str:
+    return f"{entity}:{entity_id}"
+
+class NullCache:
+    def get(self, key: str) -> Any | None:
+        return None
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+class LRUCache:
+    backend = "memory"
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+# LRU local + log de invalidaciones en un archivo sqlite compartido entre workers.
+# Cada proceso lee el log como mucho cada `sync_interval` segundos, asi que una
+# escritura en otro worker tarda ese tiempo en verse
+class SharedLRUCache(LRUCache):
+    backend = "shared"
+
+    def __init__(self, max_size: int, ttl: float, path: str, sync_interval: float):
+        super().__init__(max_size, ttl)
+        self.origin = uuid4().hex
+        self.sync_interval = sync_interval
+        self._conn_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS invalidations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, origin TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._last_seen = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+        self._last_sync = time.monotonic()
+        self._published = 0
+
+    def get(self, key: str) -> Any | None:
+        self._sync()
+        return super().get(key)
+
+    def delete(self, key: str):
+        super().delete(key)
+        with self._conn_lock:
+            self._conn.execute(
+                "INSERT INTO invalidations (key, origin, created_at) VALUES (?, ?, ?)",
+                (key, self.origin, time.time())
+            )
+            self._published += 1
+            # una invalidación más vieja que el ttl ya no puede afectar a ninguna entrada
+            if self._published % 1000 == 0:
+                self._conn.execute("DELETE FROM invalidations WHERE created_at < ?", (time.time() - self.ttl,))
+
+    def _sync(self):
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+
+        with self._conn_lock:
+            if time.monotonic() - self._last_sync < self.sync_interval:
+                return
+            rows = self._conn.execute(
+                "SELECT id, key, origin FROM invalidations WHERE id > ? ORDER BY id",
+                (self._last_seen,)
+            ).fetchall()
+            self._last_sync = time.monotonic()
+
+        for row_id, key, origin in rows:
+            self._last_seen = row_id
+            if origin != self.origin:
+                super().delete(key)
+
+def build_entity_cache() -> NullCache | LRUCache:
+    if CACHE_BACKEND == "none":
+        return NullCache()
+    if CACHE_BACKEND == "shared":
+        return SharedLRUCache(CACHE_MAX_SIZE, CACHE_TTL, CACHE_SHARED_PATH, CACHE_SYNC_INTERVAL)
+    return LRUCache(CACHE_MAX_SIZE, CACHE_TTL)
+
+entity_cache = build_entity_cache()
@@ -1,15 +1,22 @@
 from uuid import UUID
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import Session, SQLModel, create_engine, text
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
 from sqlalchemy.exc import IntegrityError
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 
-from app.schemas.client import ClientCreate
-from app.schemas.vehicle import VehicleCreate
-from app.schemas.repairs import RepairsCreate, RepairStatus
-from app.schemas.mechanic import MechanicCreate
+from app.schemas.client import ClientCreate, ClientRead
+from app.schemas.vehicle import VehicleCreate, VehicleRead, normalize_plate
+from app.schemas.repairs import RepairsCreate, RepairsRead, RepairStatus
+from app.schemas.mechanic import MechanicCreate, MechanicRead
 from app.models import Mechanic, Client, Vehicle, Repairs
 from app.auth.security import hash_pwd
+from app.cache import entity_cache, cache_key
+from app.intervals import create_interval_index, get_mechanic_rowid, find_overlaps, index_repair
+from app.rollups import create_rollups, repair_opened
+from app.history import invalidate_vehicle
+from app.events import record_repair_event, repair_events
 
 sql_filename = "database.db"
 sql_url = f"sqlite:///{sql_filename}"
@@ -17,8 +24,34 @@ sql_url = f"sqlite:///{sql_filename}"
 connect_args = {"check_same_thread": False}
 engine = create_engine(sql_url, connect_args=connect_args)
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # auto_vacuum solo se aplica si la base todavía no tiene tablas (en una existente hace falta un VACUUM)
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+def add_plate_key_column(connection: Connection):
+    columns = [row[1] for row in connection.execute(text("PRAGMA table_info(vehicle)"))]
+    if "plate_key" in columns:
+        return
+
+    # bases creadas antes de la columna plate_key
+    connection.execute(text("ALTER TABLE vehicle ADD COLUMN plate_key VARCHAR NOT NULL DEFAULT ''"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicle_plate_key ON vehicle (plate_key)"))
+    for row_id, plate in connection.execute(text("SELECT rowid, license_plate FROM vehicle")).all():
+        connection.execute(text("UPDATE vehicle SET plate_key = :key WHERE rowid = :row_id"),
+                           {"key": normalize_plate(plate), "row_id": row_id})
+
 def create_db_and_tables():
+    with engine.begin() as connection:
+        if connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'vehicle'")).first():
+            add_plate_key_column(connection)
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_interval_index(connection)
+    create_rollups(engine)
 
 def get_session():
     with Session(engine) as session:
@@ -40,6 +73,7 @@ def save_mechanic_in_db(session: Session, mechanic_data: MechanicCreate) -> Mech
     session.add(mechanic)
     session.commit()
     session.refresh(mechanic)
+    entity_cache.set(cache_key("mechanic", mechanic.id), MechanicRead.model_validate(mechanic))
     return mechanic
 
 def save_client_in_db(client_data: ClientCreate, session: Session) -> Client:
@@ -51,6 +85,7 @@ def save_client_in_db(client_data: ClientCreate, session: Session) -> Client:
     session.add(client)
     session.commit()
     session.refresh(client)
+    entity_cache.set(cache_key("client", client.id), ClientRead.model_validate(client))
     return client
 
 
@@ -61,6 +96,7 @@ def save_vehicle_in_db(session: Session, vehicle_data: VehicleCreate, client_id:
     
     vehicle = Vehicle(
         license_plate=vehicle_data.license_plate,
+        plate_key=normalize_plate(vehicle_data.license_plate),
         brand=vehicle_data.brand,
         model=vehicle_data.model,
         year=vehicle_data.year,
@@ -76,12 +112,20 @@ def save_vehicle_in_db(session: Session, vehicle_data: VehicleCreate, client_id:
         raise HTTPException(status_code=400, detail="License plate must be unique")
     
     session.refresh(vehicle)
+    entity_cache.set(cache_key("vehicle", vehicle.id), VehicleRead.model_validate(vehicle))
     return vehicle
 
 def save_repair_in_db(session: Session, repair_data: RepairsCreate, mechanic_id: UUID, vehicle_id: UUID) -> Repairs:
     vehicle = session.get(Vehicle, vehicle_id)
     if not vehicle:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found")
+
+    mechanic_row = get_mechanic_rowid(session, mechanic_id)
+    if mechanic_row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mechanic not found")
+
+    if repair_data.finish_date < repair_data.start_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="finish_date must be after start_date")
     
     repair = Repairs(
         description=repair_data.description,
@@ -93,8 +137,21 @@ def save_repair_in_db(session: Session, repair_data: RepairsCreate, mechanic_id:
     )
 
     session.add(repair)
+    # el flush toma el lock de escritura de sqlite, así el chequeo de solapamiento no compite con otro alta
+    session.flush()
+
+    if find_overlaps(session, mechanic_row, repair.start_date, repair.finish_date, exclude=repair.id):
+        session.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Mechanic already has a repair in that time range")
+
+    index_repair(session, repair, mechanic_row)
+    repair_opened(session, repair, vehicle.brand)
+    invalidate_vehicle(session, vehicle_id)
+    record_repair_event(session, "created", repair)
     session.commit()
+    repair_events.wake()
     session.refresh(repair)
+    entity_cache.set(cache_key("repair", repair.id), RepairsRead.model_validate(repair))
     return repair
 
 
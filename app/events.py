@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, cast
+from uuid import UUID
+
+from decouple import config
+from sqlalchemy import Engine
+from sqlmodel import Session, select, delete, func, col
+
+from app.models import Repairs, RepairEvent
+
+EVENTS_POLL_INTERVAL = cast(float, config("EVENTS_POLL_INTERVAL", default=0.5, cast=float))
+EVENTS_SEND_BUFFER = cast(int, config("EVENTS_SEND_BUFFER", default=100, cast=int))
+EVENTS_REPLAY_MAX = cast(int, config("EVENTS_REPLAY_MAX", default=1000, cast=int))
+EVENTS_RETENTION_HOURS = cast(int, config("EVENTS_RETENTION_HOURS", default=24, cast=int))
+EVENTS_HEARTBEAT = cast(float, config("EVENTS_HEARTBEAT", default=15.0, cast=float))
+
+logger = logging.getLogger(__name__)
+
+# los handlers de reparaciones escriben un RepairEvent en la misma transacción que el cambio.
+# cada worker tiene un solo task que lee los eventos nuevos de la tabla y los reparte en
+# memoria a las conexiones suscriptas, así funciona con varios workers y se puede retomar
+# desde el último id visto
+
+def record_repair_event(session: Session, kind: str, repair: Repairs):
+    payload = {
+        "id": str(repair.id),
+        "description": repair.description,
+        "status": repair.status.value,
+        "start_date": repair.start_date.isoformat(),
+        "finish_date": repair.finish_date.isoformat(),
+        "mechanic_id": str(repair.mechanic_id),
+        "vehicle_id": str(repair.vehicle_id)
+    }
+    session.add(RepairEvent(
+        kind=kind,
+        repair_id=repair.id,
+        mechanic_id=repair.mechanic_id,
+        status=repair.status.value,
+        payload=json.dumps(payload),
+        created_at=datetime.now(timezone.utc)
+    ))
+
+def to_message(event: RepairEvent) -> dict:
+    return {
+        "id": event.id,
+        "type": event.kind,
+        "mechanic_id": str(event.mechanic_id),
+        "status": event.status,
+        "repair": json.loads(event.payload)
+    }
+
+def fetch_events(engine: Engine, after: int, limit: int, upto: int | None = None,
+                 mechanic_id: UUID | None = None, statuses: set[str] | None = None) -> list[dict]:
+    query = select(RepairEvent).where(col(RepairEvent.id) > after)
+    if upto is not None:
+        query = query.where(col(RepairEvent.id) <= upto)
+    if mechanic_id:
+        query = query.where(RepairEvent.mechanic_id==mechanic_id)
+    if statuses:
+        query = query.where(col(RepairEvent.status).in_(statuses))
+
+    with Session(engine) as session:
+        events = session.exec(query.order_by(col(RepairEvent.id)).limit(limit)).all()
+        return [to_message(event) for event in events]
+
+def last_event_id(engine: Engine) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.coalesce(func.max(RepairEvent.id), 0))).one()
+
+def prune_events(engine: Engine):
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=EVENTS_RETENTION_HOURS)
+    with Session(engine) as session:
+        session.execute(delete(RepairEvent).where(col(RepairEvent.created_at) < cutoff))
+        session.commit()
+
+class Subscription:
+    def __init__(self, mechanic_id: UUID | None, statuses: set[str] | None, buffer: int):
+        self.mechanic_id = mechanic_id
+        self.statuses = statuses
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=buffer)
+        self.backlog: list[dict] = []
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        if self.mechanic_id and event["mechanic_id"] != str(self.mechanic_id):
+            return False
+        if self.statuses and event["status"] not in self.statuses:
+            return False
+        return True
+
+class RepairEventBroker:
+    def __init__(self):
+        self.subscriptions: set[Subscription] = set()
+        self.last_id = 0
+        self._engine: Engine | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, engine: Engine):
+        self._engine = engine
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        await asyncio.to_thread(prune_events, engine)
+        self.last_id = await asyncio.to_thread(last_event_id, engine)
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+    def wake(self):
+        # se llama después del commit (desde el loop o desde un thread) para no esperar al próximo poll
+        if self._loop and self._wake:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _tail(self):
+        assert self._engine and self._wake
+        polls = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), EVENTS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                events = await asyncio.to_thread(fetch_events, self._engine, self.last_id, 500)
+                polls += 1
+                if polls % 10000 == 0:
+                    await asyncio.to_thread(prune_events, self._engine)
+            except Exception:
+                logger.exception("Error reading repair events")
+                continue
+
+            for event in events:
+                self.last_id = event["id"]
+                self._fan_out(event)
+            if len(events) == 500:
+                self._wake.set()
+
+    def _fan_out(self, event: dict):
+        for subscription in list(self.subscriptions):
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # cliente lento: se corta y tiene que reconectar con el último id que recibió
+                subscription.overflowed = True
+                self.subscriptions.discard(subscription)
+
+    async def subscribe(self, mechanic_id: UUID | None, statuses: set[str] | None, after: int | None) -> Subscription:
+        assert self._engine
+        subscription = Subscription(mechanic_id, statuses, EVENTS_SEND_BUFFER)
+        # lo que llegue después de last_id va a la cola; lo anterior se lee de la tabla
+        upto = self.last_id
+        self.subscriptions.add(subscription)
+
+        if after is not None and after < upto:
+            backlog = await asyncio.to_thread(
+                fetch_events, self._engine, after, EVENTS_REPLAY_MAX + 1, upto, mechanic_id, statuses
+            )
+            if len(backlog) > EVENTS_REPLAY_MAX:
+                # demasiado atrasado para reenviar todo: el cliente tiene que recargar el estado
+                backlog = [{"id": upto, "type": "reset"}]
+            subscription.backlog = backlog
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    async def listen(self, subscription: Subscription) -> AsyncIterator[dict | None]:
+        # devuelve None cada EVENTS_HEARTBEAT segundos sin eventos, para mantener viva la conexión
+        for event in subscription.backlog:
+            yield event
+        subscription.backlog = []
+
+        while not (subscription.overflowed and subscription.queue.empty()):
+            try:
+                yield await asyncio.wait_for(subscription.queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield None
+
+repair_events = RepairEventBroker()
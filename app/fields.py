@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Annotated, Any, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy.orm import load_only
+from sqlmodel import SQLModel
+
+# sparse fieldsets: ?fields=id,license_plate,status devuelve solo esos campos del schema
+# de lectura y además hace que el SELECT traiga solo esas columnas (más la primary key)
+
+def sparse_fields(schema: type[BaseModel]):
+    def dependency(
+        fields: Annotated[str | None, Query(description=f"Comma separated subset of: {', '.join(schema.model_fields)}")] = None
+    ) -> list[str] | None:
+        if fields is None:
+            return None
+        selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in selected if name not in schema.model_fields]
+        if not selected or unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown) or fields}")
+        return selected
+    return dependency
+
+def only_columns(query, model: type[SQLModel], fields: list[str] | None):
+    if fields is None:
+        return query
+    return query.options(load_only(*[getattr(model, name) for name in fields]))
+
+@lru_cache(maxsize=128)
+def partial_adapter(schema: type[BaseModel], fields: tuple[str, ...]) -> TypeAdapter:
+    partial = create_model( # type: ignore
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, ...) for name in fields}
+    )
+    return TypeAdapter(list[partial])
+
+def sparse_response(items: Sequence[Any], schema: type[BaseModel], fields: list[str] | None):
+    # sin fields se devuelve la lista tal cual y la valida el response_model del endpoint
+    if fields is None:
+        return items
+    adapter = partial_adapter(schema, tuple(fields))
+    return Response(content=adapter.dump_json(adapter.validate_python(items, from_attributes=True)), media_type="application/json")
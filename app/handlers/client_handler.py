@@ -3,19 +3,38 @@ from uuid import UUID
 from typing import Annotated, Sequence
 from fastapi import Depends, HTTPException
 
-from app.models import Client
-from app.schemas.client import ClientUpdate
+from app.models import Client, ClientArchive
+from app.schemas.client import ClientRead, ClientUpdate
 from sqlmodel import select, Session
 from app.db import get_session
+from app.cache import entity_cache, cache_key
+from app.history import invalidate_client
+from app.fields import only_columns
+from app.batch import batch_get
+from app.schemas.batch import BatchItem
+
+async def get_client_data(client_id: UUID, session: Annotated[Session, Depends(get_session)]) -> ClientRead | None:
+    key = cache_key("client", client_id)
+    cached = entity_cache.get(key)
+    if cached is not None:
+        return cached
 
-async def get_client_data(client_id: UUID, session: Annotated[Session, Depends(get_session)]) -> Client | None:
     data = session.exec(select(Client).where(Client.id == client_id)).one_or_none()
+    if data is None:
+        # los clientes borrados se mueven al archivo pero siguen existiendo
+        data = session.get(ClientArchive, client_id)
     if data:
-        return data
+        client = ClientRead.model_validate(data)
+        entity_cache.set(key, client)
+        return client
     return None
 
-async def search_clients(session: Annotated[Session, Depends(get_session)], q: str | None = None, limit: int = 20) -> Sequence[Client]:
-    query = select(Client).where(Client.deleted_at==None)
+async def get_clients_data(session: Annotated[Session, Depends(get_session)], ids: list[UUID]) -> list[BatchItem]:
+    return batch_get(session, Client, ClientRead, "client", ids, archive=ClientArchive)
+
+async def search_clients(session: Annotated[Session, Depends(get_session)], q: str | None = None, limit: int = 20,
+                        fields: list[str] | None = None) -> Sequence[Client]:
+    query = only_columns(select(Client).where(Client.deleted_at==None), Client, fields)
 
     if q:
         query = query.where(Client.name.ilike(f"%{q}%")) # type: ignore
@@ -36,8 +55,10 @@ async def update_client(session: Annotated[Session, Depends(get_session)], clien
         setattr(client, key, value)
 
     session.add(client)
+    invalidate_client(session, client_id)
     session.commit()
     session.refresh(client)
+    entity_cache.delete(cache_key("client", client_id))
 
     return client 
 
@@ -50,8 +71,10 @@ async def delete_client(session: Annotated[Session, Depends(get_session)], clien
     client.deleted_at = datetime.now(timezone.utc)
 
     session.add(client)
+    invalidate_client(session, client_id)
     session.commit()
     session.refresh(client)
+    entity_cache.delete(cache_key("client", client_id))
 
     return None
  
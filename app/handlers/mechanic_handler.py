@@ -3,11 +3,18 @@ from uuid import UUID
 from typing import Annotated, Sequence
 
 from app.models import Mechanic
-from app.schemas.mechanic import MechanicUpdate 
+from app.schemas.mechanic import MechanicRead, MechanicUpdate 
 from sqlmodel import select, Session
 from fastapi import Depends, HTTPException
 from app.db import get_session
 from app.auth.security import hash_pwd, verify_pwd
+from app.auth.refresh import revoke_refresh_tokens
+from app.cache import entity_cache, cache_key
+from app.intervals import busy_mechanic_ids
+from app.history import invalidate_mechanic
+from app.fields import only_columns
+from app.batch import batch_get
+from app.schemas.batch import BatchItem
 
 async def check_mechanic(session: Annotated[Session, Depends(get_session)], username: str, password: str) -> Mechanic | None:
     query = select(Mechanic).where(Mechanic.email==username, Mechanic.deleted_at==None)
@@ -18,13 +25,26 @@ async def check_mechanic(session: Annotated[Session, Depends(get_session)], user
     
     return None
 
-async def get_mechanic_data(session: Annotated[Session, Depends(get_session)], mechanic_id: UUID) -> Mechanic | None:   
+async def get_mechanic_data(session: Annotated[Session, Depends(get_session)], mechanic_id: UUID) -> MechanicRead | None:   
+    key = cache_key("mechanic", mechanic_id)
+    cached = entity_cache.get(key)
+    if cached is not None:
+        return cached
+
     data = session.exec(select(Mechanic).where(Mechanic.id==mechanic_id)).one_or_none()
-    return data
+    if data:
+        mechanic = MechanicRead.model_validate(data)
+        entity_cache.set(key, mechanic)
+        return mechanic
+    return None
+
 
-  
-async def search_mechanics(session:  Annotated[Session, Depends(get_session)], q: str | None = None) -> Sequence[Mechanic]:
-    query = select(Mechanic).where(Mechanic.deleted_at == None)
+async def get_mechanics_data(session: Annotated[Session, Depends(get_session)], ids: list[UUID]) -> list[BatchItem]:
+    return batch_get(session, Mechanic, MechanicRead, "mechanic", ids)
+
+async def search_mechanics(session:  Annotated[Session, Depends(get_session)], q: str | None = None,
+                           fields: list[str] | None = None) -> Sequence[Mechanic]:
+    query = only_columns(select(Mechanic).where(Mechanic.deleted_at == None), Mechanic, fields)
 
     if q:
         query = query.where(Mechanic.name.ilike(f"%{q}%")) # type: ignore
@@ -32,6 +52,13 @@ async def search_mechanics(session:  Annotated[Session, Depends(get_session)], q
     mechanics = session.exec(query).all()
     return mechanics
      
+async def get_available_mechanics(session: Annotated[Session, Depends(get_session)], start: datetime, finish: datetime,
+                                  fields: list[str] | None = None) -> Sequence[Mechanic]:
+    busy = busy_mechanic_ids(session, start, finish)
+    query = only_columns(select(Mechanic).where(Mechanic.deleted_at == None).order_by(Mechanic.name), Mechanic, fields)
+    mechanics = session.exec(query).all()
+    return [mechanic for mechanic in mechanics if mechanic.id not in busy]
+     
 async def update_mechanic(session: Annotated[Session, Depends(get_session)], mechanic_id: UUID, update: MechanicUpdate) -> Mechanic:
     query = select(Mechanic).where(Mechanic.id==mechanic_id, Mechanic.deleted_at==None)
 
@@ -43,13 +70,17 @@ async def update_mechanic(session: Annotated[Session, Depends(get_session)], mec
     
     if "password" in update_data:
         update_data["password"] = hash_pwd(update_data["password"]) # -> quizás hacer una función y endpoint aparte para actualizas pwd
+        # cambió la contraseña: las sesiones abiertas en otros dispositivos no pueden renovarse más
+        revoke_refresh_tokens(session, mechanic_id)
 
     for key, value in update_data.items():
         setattr(mechanic, key, value)
 
     session.add(mechanic)
+    invalidate_mechanic(session, mechanic_id)
     session.commit()
     session.refresh(mechanic)        
+    entity_cache.delete(cache_key("mechanic", mechanic_id))
     
     return mechanic
 
@@ -62,8 +93,11 @@ async def delete_mechanic(session: Annotated[Session, Depends(get_session)], mec
     mechanic.deleted_at = datetime.now(timezone.utc)
 
     session.add(mechanic)
+    invalidate_mechanic(session, mechanic_id)
+    revoke_refresh_tokens(session, mechanic_id)
     session.commit()
     session.refresh(mechanic)
+    entity_cache.delete(cache_key("mechanic", mechanic_id))
 
     return None
     
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from uuid import UUID
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+
+from app.models import Client, Notification, Repairs, Vehicle
+from app.db import engine
+from app.jobs import job_handler, utcnow
+
+logger = logging.getLogger(__name__)
+
+# la notificación queda registrada en la tabla Notification. La clave de deduplicación
+# es el id del job, así un reintento del mismo job no notifica dos veces.
+# todavía no hay canal de envío (mail/sms) configurado, por ahora solo se loguea
+def save_repair_ready_notification(job_id: UUID, repair_id: UUID):
+    with Session(engine) as session:
+        repair = session.get(Repairs, repair_id)
+        vehicle = session.get(Vehicle, repair.vehicle_id) if repair else None
+        client = session.get(Client, vehicle.client_id) if vehicle else None
+        if not repair or not vehicle or not client:
+            return
+
+        message = f"Hola {client.name}, tu vehículo {vehicle.license_plate} ya está listo para retirar"
+        result = session.execute(
+            insert(Notification).values(
+                dedup_key=f"repair_ready:{job_id}",
+                kind="repair_ready",
+                message=message,
+                created_at=utcnow(),
+                client_id=client.id,
+                repair_id=repair.id
+            ).on_conflict_do_nothing(index_elements=["dedup_key"])
+        )
+        session.commit()
+
+        if result.rowcount: # type: ignore
+            logger.info("Notify %s <%s>: %s", client.name, client.email, message)
+
+@job_handler("repair_ready")
+async def notify_repair_ready(job_id: UUID, payload: dict):
+    await asyncio.to_thread(save_repair_ready_notification, job_id, UUID(payload["repair_id"]))
@@ -1,32 +1,62 @@
 from datetime import datetime, timezone
 from uuid import UUID
 from fastapi import HTTPException, Depends
-from app.schemas.repairs import RepairsUpdate, RepairStatus
-from app.models import Repairs, Vehicle, Client
+from app.schemas.repairs import RepairsRead, RepairsUpdate, RepairStatus
+from app.schemas.vehicle import normalize_plate
+from app.models import Repairs, RepairsArchive, Vehicle, Client, Record
 from sqlmodel import select, Session
 from typing import Annotated, Sequence
 from app.db import get_session
+from app.cache import entity_cache, cache_key
+from app.intervals import unindex_repair
+from app.rollups import repair_status_changed, repair_removed, repair_buckets, shop_now
+from app.history import invalidate_vehicle
+from app.jobs import enqueue
+from app.events import record_repair_event, repair_events
+from app.fields import only_columns
+from app.batch import batch_get
+from app.schemas.batch import BatchItem
+
+async def get_repair_data(session: Annotated[Session, Depends(get_session)], repair_id: UUID) -> RepairsRead | None:
+    key = cache_key("repair", repair_id)
+    cached = entity_cache.get(key)
+    if cached is not None:
+        return cached
 
-async def get_repair_data(session: Annotated[Session, Depends(get_session)], repair_id: UUID) -> Repairs | None:
     data = session.exec(select(Repairs).where(Repairs.id==repair_id)).one_or_none()
-    return data
+    if data is None:
+        # las reparaciones viejas se mueven al archivo pero siguen existiendo
+        data = session.get(RepairsArchive, repair_id)
+    if data:
+        repair = RepairsRead.model_validate(data)
+        entity_cache.set(key, repair)
+        return repair
+    return None
+
+async def get_repairs_data(session: Annotated[Session, Depends(get_session)], ids: list[UUID]) -> list[BatchItem]:
+    return batch_get(session, Repairs, RepairsRead, "repair", ids, archive=RepairsArchive)
 
 async def search_repairs(
         session: Annotated[Session, Depends(get_session)], 
         license_plate: str | None = None, 
         client_name: str | None = None,
         status: RepairStatus | None = None,
-        limit: int = 20
+        limit: int = 20,
+        fields: list[str] | None = None
 ) -> Sequence[Repairs]:
     if not license_plate and not client_name:
         return []
         
-    query = select(Repairs).where(Repairs.deleted_at==None).join(Vehicle).join(Client)
+    query = only_columns(select(Repairs).where(Repairs.deleted_at==None).join(Vehicle).join(Client), Repairs, fields)
         
     conditions = []
 
     if license_plate:
-        conditions.append(Vehicle.license_plate.ilike(f"%{license_plate}%")) # type: ignore
+        plate_key = normalize_plate(license_plate)
+        # solo separadores ("---"): con contains('') matchearía cualquier patente
+        if not plate_key:
+            return []
+        conditions.append(Vehicle.plate_key.contains(plate_key)) # type: ignore
     if client_name:
         conditions.append(Client.name.ilike(f"%{client_name}%")) # type: ignore
     if status:
@@ -34,25 +64,50 @@ async def search_repairs(
     if conditions:
         query = query.where(*conditions)
         
-    query = query.order_by(str(Repairs.start_date)).limit(limit)
+    query = query.order_by(Repairs.start_date).limit(limit)
     result = session.exec(query).all()
     return result
 
-async def get_record_of_repairs(session: Annotated[Session, Depends(get_session)], vehicle_id: UUID) -> Sequence[Repairs]:
+async def get_record_of_repairs(
+        session: Annotated[Session, Depends(get_session)], 
+        vehicle_id: UUID, 
+        include_archived: bool = False,
+        fields: list[str] | None = None
+) -> Sequence[Repairs | RepairsArchive]:
     query = select(Repairs).where(
         Repairs.deleted_at==None,
         Repairs.vehicle_id==vehicle_id
     )
-    result = session.exec(query).all()
+    result = session.exec(only_columns(query, Repairs, fields)).all()
+
+    if include_archived:
+        archived = session.exec(only_columns(select(RepairsArchive).where(
+            RepairsArchive.deleted_at==None,
+            RepairsArchive.vehicle_id==vehicle_id
+        ), RepairsArchive, fields)).all()
+        return [*archived, *result]
 
     return result
 
-async def get_mechanic_repairs(session: Annotated[Session, Depends(get_session)], mechanic_id: UUID) -> Sequence[Repairs]:
+async def get_mechanic_repairs(
+        session: Annotated[Session, Depends(get_session)], 
+        mechanic_id: UUID, 
+        include_archived: bool = False,
+        fields: list[str] | None = None
+) -> Sequence[Repairs | RepairsArchive]:
     query = select(Repairs).where(
         Repairs.deleted_at==None,
         Repairs.mechanic_id==mechanic_id
     )
-    result = session.exec(query).all()
+    result = session.exec(only_columns(query, Repairs, fields)).all()
+
+    if include_archived:
+        archived = session.exec(only_columns(select(RepairsArchive).where(
+            RepairsArchive.deleted_at==None,
+            RepairsArchive.mechanic_id==mechanic_id
+        ), RepairsArchive, fields)).all()
+        return [*archived, *result]
+
     return result
 
 async def update_info(session: Annotated[Session, Depends(get_session)], repair_id: UUID, update: RepairsUpdate) -> Repairs:
@@ -61,12 +116,27 @@ async def update_info(session: Annotated[Session, Depends(get_session)], repair_
 
     if not repair:
         raise HTTPException(status_code=404, detail="Repair not found")
-        
+
+    previous_status = repair.status
+    previous_buckets = repair_buckets(session, repair) if update.status != previous_status else []
     repair.description = update.description
     repair.status = update.status
     session.add(repair)
+
+    if update.status != previous_status:
+        changed_at = shop_now()
+        session.add(Record(date=changed_at, description=update.description or "", status=update.status.value, repair_id=repair.id))
+        vehicle = session.get(Vehicle, repair.vehicle_id)
+        repair_status_changed(session, repair, vehicle.brand if vehicle else "", previous_buckets)
+        if update.status == RepairStatus.listo:
+            enqueue(session, "repair_ready", {"repair_id": str(repair.id)})
+
+    invalidate_vehicle(session, repair.vehicle_id)
+    record_repair_event(session, "updated", repair)
     session.commit()
+    repair_events.wake()
     session.refresh(repair)
+    entity_cache.delete(cache_key("repair", repair_id))
 
     return repair
 
@@ -77,11 +147,20 @@ async def delete_repair(session: Annotated[Session, Depends(get_session)], repai
     if not repair:
         raise HTTPException(status_code=404, detail="Repair not found")
 
+    was_active = repair.deleted_at is None
     repair.deleted_at = datetime.now(timezone.utc)
 
     session.add(repair)
+    unindex_repair(session, repair_id)
+    if was_active:
+        vehicle = session.get(Vehicle, repair.vehicle_id)
+        repair_removed(session, repair, vehicle.brand if vehicle else "")
+        record_repair_event(session, "deleted", repair)
+    invalidate_vehicle(session, repair.vehicle_id)
     session.commit()
+    repair_events.wake()
     session.refresh(repair)
+    entity_cache.delete(cache_key("repair", repair_id))
 
     return None
  
@@ -0,0 +1,55 @@
+from datetime import date
+from fastapi import Depends
+from typing import Annotated
+from sqlmodel import select, Session, func
+
+from app.models import RepairRollup
+from app.schemas.report import Granularity, ReportGroup, RepairReportRow
+from app.db import get_session
+
+def period_of(granularity: Granularity):
+    if granularity == Granularity.week:
+        # lunes de la semana
+        return func.date(RepairRollup.day, "weekday 0", "-6 days")
+    if granularity == Granularity.month:
+        return func.date(RepairRollup.day, "start of month")
+    return func.date(RepairRollup.day)
+
+async def get_repair_report(
+        session: Annotated[Session, Depends(get_session)],
+        granularity: Granularity,
+        start: date,
+        finish: date,
+        group_by: ReportGroup | None = None
+) -> list[RepairReportRow]:
+    period = period_of(granularity).label("period")
+    columns = [period]
+    if group_by == ReportGroup.mechanic:
+        columns.append(RepairRollup.mechanic_id)
+    elif group_by == ReportGroup.brand:
+        columns.append(RepairRollup.brand)
+
+    query = select(
+        *columns,
+        func.sum(RepairRollup.opened),
+        func.sum(RepairRollup.finished),
+        func.sum(RepairRollup.delivered)
+    ).where(
+        RepairRollup.day >= start,
+        RepairRollup.day <= finish
+    ).group_by(*columns).having(
+        # los buckets que quedaron en cero por reparaciones borradas no se muestran
+        func.sum(RepairRollup.opened) + func.sum(RepairRollup.finished) + func.sum(RepairRollup.delivered) != 0
+    ).order_by(*columns)
+
+    rows = []
+    for row in session.exec(query).all():
+        rows.append(RepairReportRow(
+            period=date.fromisoformat(row[0]),
+            mechanic_id=row[1] if group_by == ReportGroup.mechanic else None,
+            brand=row[1] if group_by == ReportGroup.brand else None,
+            opened=row[-3],
+            finished=row[-2],
+            delivered=row[-1]
+        ))
+    return rows
@@ -0,0 +1,101 @@
+from uuid import UUID
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, update, col, union
+
+from app.models import Client, Mechanic, Record, Repairs, RepairsArchive, Vehicle, VehicleHistorySnapshot
+from app.schemas.client import ClientRead
+from app.schemas.vehicle import VehicleRead
+from app.schemas.mechanic import MechanicRead
+from app.schemas.history import RepairHistory, StatusChange, VehicleHistory
+
+# historial completo de un vehículo guardado como un JSON ya armado (una fila por vehículo).
+# los handlers de escritura lo invalidan en su misma transacción (document=NULL, version+1)
+# y se reconstruye en la próxima lectura. La versión evita que una lectura que armó el
+# documento con datos viejos pise una invalidación que llegó en el medio
+
+def invalidate_vehicle(session: Session, vehicle_id: UUID):
+    invalidate(session, col(VehicleHistorySnapshot.vehicle_id)==vehicle_id)
+
+def invalidate_client(session: Session, client_id: UUID):
+    invalidate(session, col(VehicleHistorySnapshot.client_id)==client_id)
+
+def invalidate_mechanic(session: Session, mechanic_id: UUID):
+    # también los vehículos con reparaciones archivadas, que el historial incluye con su mecánico
+    vehicle_ids = union(
+        select(Repairs.vehicle_id).where(Repairs.mechanic_id==mechanic_id),
+        select(RepairsArchive.vehicle_id).where(RepairsArchive.mechanic_id==mechanic_id)
+    )
+    invalidate(session, col(VehicleHistorySnapshot.vehicle_id).in_(vehicle_ids))
+
+def invalidate(session: Session, condition):
+    session.execute(
+        update(VehicleHistorySnapshot)
+        .where(condition)
+        .values(document=None, version=VehicleHistorySnapshot.version + 1)
+    )
+
+def build_history(session: Session, vehicle: Vehicle) -> VehicleHistory:
+    owner = session.get(Client, vehicle.client_id)
+    # el historial completo incluye las reparaciones archivadas (entregadas hace tiempo)
+    archived = session.exec(
+        select(RepairsArchive).where(RepairsArchive.vehicle_id==vehicle.id, RepairsArchive.deleted_at==None)
+    ).all()
+    repairs = [*archived, *session.exec(
+        select(Repairs).where(Repairs.vehicle_id==vehicle.id, Repairs.deleted_at==None)
+    ).all()]
+    repairs.sort(key=lambda repair: repair.start_date)
+
+    repair_ids = [repair.id for repair in repairs]
+    mechanic_ids = {repair.mechanic_id for repair in repairs}
+    mechanics = {
+        mechanic.id: MechanicRead.model_validate(mechanic)
+        for mechanic in session.exec(select(Mechanic).where(col(Mechanic.id).in_(mechanic_ids))).all()
+    }
+    timelines: dict[UUID, list[StatusChange]] = {repair_id: [] for repair_id in repair_ids}
+    records = session.exec(select(Record).where(col(Record.repair_id).in_(repair_ids)).order_by(col(Record.date))).all()
+    for record in records:
+        timelines[record.repair_id].append(StatusChange.model_validate(record))
+
+    return VehicleHistory(
+        vehicle=VehicleRead.model_validate(vehicle),
+        owner=ClientRead.model_validate(owner) if owner else None,
+        repairs=[
+            RepairHistory(
+                id=repair.id,
+                description=repair.description,
+                status=repair.status,
+                start_date=repair.start_date,
+                finish_date=repair.finish_date,
+                mechanic=mechanics.get(repair.mechanic_id),
+                timeline=timelines[repair.id]
+            )
+            for repair in repairs
+        ]
+    )
+
+def get_history_document(session: Session, vehicle_id: UUID) -> str | None:
+    snapshot = session.get(VehicleHistorySnapshot, vehicle_id)
+    if snapshot and snapshot.document is not None:
+        return snapshot.document
+
+    vehicle = session.get(Vehicle, vehicle_id)
+    if not vehicle:
+        return None
+
+    if not snapshot:
+        session.execute(
+            insert(VehicleHistorySnapshot)
+            .values(vehicle_id=vehicle_id, client_id=vehicle.client_id, version=0)
+            .on_conflict_do_nothing()
+        )
+        session.commit()
+    version = session.exec(select(VehicleHistorySnapshot.version).where(VehicleHistorySnapshot.vehicle_id==vehicle_id)).one()
+
+    document = build_history(session, vehicle).model_dump_json()
+    session.execute(
+        update(VehicleHistorySnapshot)
+        .where(col(VehicleHistorySnapshot.vehicle_id)==vehicle_id, col(VehicleHistorySnapshot.version)==version)
+        .values(document=document)
+    )
+    session.commit()
+    return document
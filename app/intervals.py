@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from typing import Sequence
+from uuid import UUID
+from sqlalchemy import Column, Float, Integer, MetaData, Table, literal_column, text
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select, delete
+
+from app.models import Mechanic, Repairs
+
+# índice de intervalos (sqlite R*Tree) sobre las reparaciones activas.
+# dimensiones: (start_at, finish_at) en epoch segundos y (mechanic_lo, mechanic_hi) = rowid del mecánico,
+# así una búsqueda por mecánico + rango de fechas es una sola consulta al R*Tree.
+# el R*Tree guarda floats de 32 bits, así que es un prefiltro: siempre se re-chequea contra Repairs
+interval_metadata = MetaData()
+repair_interval = Table(
+    "repair_interval", interval_metadata,
+    Column("id", Integer, primary_key=True), # rowid de repairs
+    Column("start_at", Float),
+    Column("finish_at", Float),
+    Column("mechanic_lo", Float),
+    Column("mechanic_hi", Float)
+)
+
+repairs_rowid = literal_column("repairs.rowid")
+mechanic_rowid = literal_column("mechanic.rowid")
+
+def to_epoch(value: datetime) -> float:
+    # las fechas se guardan sin zona horaria, se comparan como hora local del taller
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def create_interval_index(connection: Connection):
+    connection.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS repair_interval "
+        "USING rtree(id, start_at, finish_at, mechanic_lo, mechanic_hi)"
+    ))
+    indexed = connection.execute(text("SELECT COUNT(*) FROM repair_interval")).scalar()
+    if indexed:
+        return
+
+    # backfill de las reparaciones que ya existían antes del índice.
+    # strftime('%s') descarta los microsegundos, por eso se agranda el intervalo un segundo de cada lado
+    connection.execute(text(
+        "INSERT INTO repair_interval (id, start_at, finish_at, mechanic_lo, mechanic_hi) "
+        "SELECT repairs.rowid, strftime('%s', repairs.start_date) - 1, strftime('%s', repairs.finish_date) + 1, "
+        "mechanic.rowid, mechanic.rowid "
+        "FROM repairs JOIN mechanic ON mechanic.id = repairs.mechanic_id "
+        "WHERE repairs.deleted_at IS NULL"
+    ))
+
+def get_mechanic_rowid(session: Session, mechanic_id: UUID) -> int | None:
+    return session.exec(select(mechanic_rowid).where(Mechanic.id==mechanic_id)).one_or_none() # type: ignore
+
+def get_repair_rowid(session: Session, repair_id: UUID) -> int | None:
+    return session.exec(select(repairs_rowid).where(Repairs.id==repair_id)).one_or_none() # type: ignore
+
+def index_repair(session: Session, repair: Repairs, mechanic_row: int):
+    repair_row = get_repair_rowid(session, repair.id)
+    session.execute(delete(repair_interval).where(repair_interval.c.id==repair_row))
+    session.execute(repair_interval.insert().values(
+        id=repair_row,
+        start_at=to_epoch(repair.start_date),
+        finish_at=to_epoch(repair.finish_date),
+        mechanic_lo=mechanic_row,
+        mechanic_hi=mechanic_row
+    ))
+
+def unindex_repair(session: Session, repair_id: UUID):
+    repair_row = get_repair_rowid(session, repair_id)
+    if repair_row is not None:
+        session.execute(delete(repair_interval).where(repair_interval.c.id==repair_row))
+
+def overlap_conditions(start: datetime, finish: datetime) -> list:
+    # dos intervalos [a, b) y [c, d) se pisan si a < d y c < b
+    return [
+        repair_interval.c.start_at <= to_epoch(finish),
+        repair_interval.c.finish_at >= to_epoch(start),
+        Repairs.start_date < finish,
+        Repairs.finish_date > start,
+        Repairs.deleted_at==None
+    ]
+
+def find_overlaps(session: Session, mechanic_row: int, start: datetime, finish: datetime, exclude: UUID | None = None) -> Sequence[Repairs]:
+    query = select(Repairs).join(repair_interval, repair_interval.c.id==repairs_rowid).where(
+        *overlap_conditions(start, finish),
+        repair_interval.c.mechanic_lo <= mechanic_row,
+        repair_interval.c.mechanic_hi >= mechanic_row
+    )
+    if exclude:
+        query = query.where(Repairs.id!=exclude)
+    return session.exec(query).all()
+
+def busy_mechanic_ids(session: Session, start: datetime, finish: datetime) -> set[UUID]:
+    query = select(Repairs.mechanic_id).distinct().join(repair_interval, repair_interval.c.id==repairs_rowid).where(
+        *overlap_conditions(start, finish)
+    )
+    return set(session.exec(query).all())
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, cast
+from uuid import UUID
+
+from decouple import config
+from sqlalchemy import Engine, or_, and_
+from sqlmodel import Session, select, update, delete, col
+
+from app.models import OutboxJob
+
+JOBS_WORKERS = cast(int, config("JOBS_WORKERS", default=2, cast=int))
+JOBS_POLL_INTERVAL = cast(float, config("JOBS_POLL_INTERVAL", default=1.0, cast=float))
+JOBS_TIMEOUT = cast(float, config("JOBS_TIMEOUT", default=30.0, cast=float))
+JOBS_MAX_ATTEMPTS = cast(int, config("JOBS_MAX_ATTEMPTS", default=5, cast=int))
+JOBS_BACKOFF_BASE = cast(float, config("JOBS_BACKOFF_BASE", default=2.0, cast=float))
+JOBS_BACKOFF_MAX = cast(float, config("JOBS_BACKOFF_MAX", default=300.0, cast=float))
+JOBS_RETENTION_DAYS = cast(int, config("JOBS_RETENTION_DAYS", default=7, cast=int))
+# los fallidos se guardan más, para poder revisar last_error
+JOBS_FAILED_RETENTION_DAYS = cast(int, config("JOBS_FAILED_RETENTION_DAYS", default=30, cast=int))
+
+logger = logging.getLogger(__name__)
+
+# un handler recibe el id del job (sirve como clave de idempotencia, porque un job
+# se puede ejecutar más de una vez si el proceso se cae a la mitad) y el payload
+JobHandler = Callable[[UUID, dict], Awaitable[Any]]
+
+job_handlers: dict[str, tuple[JobHandler, float]] = {}
+
+def job_handler(kind: str, timeout: float | None = None):
+    def register(func: JobHandler) -> JobHandler:
+        job_handlers[kind] = (func, timeout or JOBS_TIMEOUT)
+        return func
+    return register
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def enqueue(session: Session, kind: str, payload: dict, delay: float = 0) -> OutboxJob:
+    # no hace commit: el job se guarda en la misma transacción que el cambio que lo dispara
+    now = utcnow()
+    job = OutboxJob(
+        kind=kind,
+        payload=json.dumps(payload),
+        available_at=now + timedelta(seconds=delay),
+        created_at=now
+    )
+    session.add(job)
+    return job
+
+def backoff(attempts: int) -> float:
+    delay = min(JOBS_BACKOFF_BASE ** attempts, JOBS_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+def lock_timeout() -> float:
+    return max([JOBS_TIMEOUT, *(timeout for _, timeout in job_handlers.values())])
+
+def claim_job(engine: Engine) -> tuple[UUID, str, str, int] | None:
+    now = utcnow()
+    # un job "running" con el lock vencido quedó colgado (timeout o reinicio): se vuelve a tomar
+    ready = select(OutboxJob.id).where(or_(
+        and_(col(OutboxJob.status)=="pending", col(OutboxJob.available_at) <= now),
+        and_(col(OutboxJob.status)=="running", col(OutboxJob.locked_until) < now)
+    )).order_by(col(OutboxJob.available_at)).limit(1).scalar_subquery()
+
+    with Session(engine) as session:
+        job = session.execute(
+            update(OutboxJob)
+            .where(col(OutboxJob.id)==ready)
+            .values(
+                status="running",
+                attempts=OutboxJob.attempts + 1,
+                locked_until=now + timedelta(seconds=lock_timeout() * 2)
+            )
+            .returning(OutboxJob.id, OutboxJob.kind, OutboxJob.payload, OutboxJob.attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        session.commit()
+    return tuple(job) if job else None # type: ignore
+
+def finish_job(engine: Engine, job_id: UUID, attempts: int, error: str | None):
+    now = utcnow()
+    if error is None:
+        values = {"status": "done", "finished_at": now, "last_error": None}
+    elif attempts >= JOBS_MAX_ATTEMPTS:
+        values = {"status": "failed", "finished_at": now, "last_error": error}
+    else:
+        values = {"status": "pending", "available_at": now + timedelta(seconds=backoff(attempts)), "last_error": error}
+
+    with Session(engine) as session:
+        # si el lock venció y otro worker retomó el job, attempts ya no coincide: ese resultado es el que vale
+        session.execute(
+            update(OutboxJob)
+            .where(col(OutboxJob.id)==job_id, col(OutboxJob.attempts)==attempts, col(OutboxJob.status)=="running")
+            .values(**values)
+        )
+        session.commit()
+
+def prune_jobs(engine: Engine) -> dict:
+    # corre como tarea periódica de app.maintenance
+    now = utcnow()
+    with Session(engine) as session:
+        done = session.execute(delete(OutboxJob).where(
+            col(OutboxJob.status)=="done", col(OutboxJob.finished_at) < now - timedelta(days=JOBS_RETENTION_DAYS)
+        ))
+        failed = session.execute(delete(OutboxJob).where(
+            col(OutboxJob.status)=="failed", col(OutboxJob.finished_at) < now - timedelta(days=JOBS_FAILED_RETENTION_DAYS)
+        ))
+        session.commit()
+    return {"done": done.rowcount, "failed": failed.rowcount} # type: ignore
+
+class JobWorkerPool:
+    def __init__(self, engine: Engine, workers: int = JOBS_WORKERS):
+        self.engine = engine
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # los jobs que quedan a medias siguen en "running" y se retoman al vencer el lock
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(claim_job, self.engine)
+            except Exception:
+                logger.exception("Error claiming job")
+                job = None
+
+            if job is None:
+                await asyncio.sleep(JOBS_POLL_INTERVAL)
+                continue
+
+            await self._run(*job)
+
+    async def _run(self, job_id: UUID, kind: str, payload: str, attempts: int):
+        error = None
+        handler = job_handlers.get(kind)
+        if handler is None:
+            error = f"No handler for job kind '{kind}'"
+        else:
+            func, timeout = handler
+            try:
+                await asyncio.wait_for(func(job_id, json.loads(payload)), timeout)
+            except asyncio.TimeoutError:
+                error = f"Timed out after {timeout}s"
+            except Exception as e:
+                error = repr(e)
+
+        if error:
+            logger.warning("Job %s (%s) attempt %s failed: %s", job_id, kind, attempts, error)
+        await asyncio.to_thread(finish_job, self.engine, job_id, attempts, error)
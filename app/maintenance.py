@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Callable, cast
+
+from decouple import config
+
+try:
+    import fcntl
+except ImportError: # windows: sin lock entre workers, el nombre del backup igual lleva el pid
+    fcntl = None
+
+from app.db import engine, sql_filename
+from app.archive import archive_cold_rows
+from app.auth.refresh import prune_refresh_tokens
+from app.middleware.idempotency import prune_idempotency_keys
+from app.jobs import prune_jobs
+
+OPTIMIZE_INTERVAL = cast(float, config("MAINTENANCE_OPTIMIZE_INTERVAL", default=3600, cast=float))
+CHECKPOINT_INTERVAL = cast(float, config("MAINTENANCE_CHECKPOINT_INTERVAL", default=60, cast=float))
+VACUUM_INTERVAL = cast(float, config("MAINTENANCE_VACUUM_INTERVAL", default=600, cast=float))
+VACUUM_PAGES = cast(int, config("MAINTENANCE_VACUUM_PAGES", default=200, cast=int))
+ARCHIVE_INTERVAL = cast(float, config("MAINTENANCE_ARCHIVE_INTERVAL", default=3600, cast=float))
+ARCHIVE_MAX_BATCHES = cast(int, config("MAINTENANCE_ARCHIVE_MAX_BATCHES", default=20, cast=int))
+BACKUP_INTERVAL = cast(float, config("MAINTENANCE_BACKUP_INTERVAL", default=86400, cast=float))
+BACKUP_DIR = cast(str, config("MAINTENANCE_BACKUP_DIR", default="backups"))
+BACKUP_KEEP = cast(int, config("MAINTENANCE_BACKUP_KEEP", default=7, cast=int))
+BACKUP_PAGES = cast(int, config("MAINTENANCE_BACKUP_PAGES", default=256, cast=int))
+TOKENS_INTERVAL = cast(float, config("MAINTENANCE_TOKENS_INTERVAL", default=86400, cast=float))
+IDEMPOTENCY_INTERVAL = cast(float, config("MAINTENANCE_IDEMPOTENCY_INTERVAL", default=300, cast=float))
+JOBS_INTERVAL = cast(float, config("MAINTENANCE_JOBS_INTERVAL", default=3600, cast=float))
+
+# pausa entre tramos, para que los requests puedan tomar el lock de escritura en el medio
+SLICE_PAUSE = 0.05
+
+logger = logging.getLogger(__name__)
+
+def connect() -> sqlite3.Connection:
+    return sqlite3.connect(sql_filename, timeout=5, isolation_level=None)
+
+def optimize() -> dict:
+    with closing(connect()) as connection:
+        # analysis_limit acota cuántas filas mira ANALYZE por índice, así no tarda con tablas grandes
+        connection.execute("PRAGMA analysis_limit=400")
+        connection.execute("PRAGMA optimize")
+    return {}
+
+def checkpoint() -> dict:
+    with closing(connect()) as connection:
+        busy, wal_pages, checkpointed = connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    return {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed_pages": checkpointed}
+
+def incremental_vacuum() -> dict:
+    with closing(connect()) as connection:
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return {"skipped": "auto_vacuum is not INCREMENTAL, run VACUUM once to enable it"}
+
+        freed = 0
+        while True:
+            free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_pages:
+                break
+            connection.execute(f"PRAGMA incremental_vacuum({min(free_pages, VACUUM_PAGES)})").fetchall()
+            freed += min(free_pages, VACUUM_PAGES)
+            time.sleep(SLICE_PAUSE)
+    return {"freed_pages": freed}
+
+def archive() -> dict:
+    return archive_cold_rows(engine, max_batches=ARCHIVE_MAX_BATCHES)
+
+def prune_tokens() -> dict:
+    return prune_refresh_tokens(engine)
+
+def prune_idempotency() -> dict:
+    return prune_idempotency_keys(engine)
+
+def prune_outbox() -> dict:
+    return prune_jobs(engine)
+
+def backup_files() -> list[str]:
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(name for name in os.listdir(BACKUP_DIR) if name.startswith("database-") and name.endswith(".db"))
+
+def last_backup_at() -> float | None:
+    # el último backup queda en disco: así un reinicio (o el reload de main.py) no hace otro
+    mtimes = [os.path.getmtime(os.path.join(BACKUP_DIR, name)) for name in backup_files()]
+    return max(mtimes, default=None)
+
+def backup() -> dict:
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with open(os.path.join(BACKUP_DIR, ".lock"), "w") as lock:
+        # con varios workers, uno solo copia; los demás se saltean esta vuelta
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"skipped": "another worker is taking a backup"}
+
+        # el pid evita que dos workers sin lock escriban el mismo archivo en el mismo segundo
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(BACKUP_DIR, f"database-{stamp}-{os.getpid()}.db")
+
+        source = connect()
+        target = sqlite3.connect(path)
+        try:
+            # copia de a BACKUP_PAGES páginas; si alguien escribe en el medio, sqlite reinicia la copia sola
+            source.backup(target, pages=BACKUP_PAGES, sleep=SLICE_PAUSE)
+        finally:
+            target.close()
+            source.close()
+
+        for name in backup_files()[:-BACKUP_KEEP]:
+            os.remove(os.path.join(BACKUP_DIR, name))
+    return {"path": path, "size_bytes": os.path.getsize(path)}
+
+class MaintenanceTask:
+    def __init__(self, name: str, interval: float, func: Callable[[], dict], last_run: Callable[[], float | None] | None = None):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        # last_run: cuándo corrió por última vez (epoch), para las tareas que dejan rastro en disco
+        self.last_run = last_run
+        self.next_run = time.monotonic() + min(interval, 60)
+        self.running = False
+        self.runs = 0
+        self.last_started: datetime | None = None
+        self.last_duration_ms: float | None = None
+        self.last_status: str | None = None
+        self.last_result: dict | None = None
+        self.last_error: str | None = None
+
+    def time_until_due(self) -> float:
+        last = self.last_run() if self.last_run else None
+        if last is None:
+            return 0.0
+        return max(0.0, self.interval - (time.time() - last))
+
+    def status(self) -> dict:
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "last_started": self.last_started,
+            "last_duration_ms": self.last_duration_ms,
+            "last_status": self.last_status,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_in": max(0.0, self.next_run - time.monotonic())
+        }
+
+class MaintenanceScheduler:
+    def __init__(self):
+        self.tasks: dict[str, MaintenanceTask] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def add(self, name: str, interval: float, func: Callable[[], dict], last_run: Callable[[], float | None] | None = None):
+        # interval <= 0 deshabilita la tarea
+        if interval > 0:
+            self.tasks[name] = MaintenanceTask(name, interval, func, last_run)
+
+    async def start(self):
+        # la primera vuelta un minuto después de arrancar, o cuando toque según la última corrida
+        for task in self.tasks.values():
+            task.next_run = time.monotonic() + max(min(task.interval, 60), task.time_until_due())
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            for task in list(self.tasks.values()):
+                if time.monotonic() < task.next_run:
+                    continue
+                # otro worker pudo haberla corrido mientras tanto
+                remaining = await asyncio.to_thread(task.time_until_due)
+                if remaining > 0:
+                    task.next_run = time.monotonic() + remaining
+                else:
+                    await self.run(task.name)
+            await asyncio.sleep(1)
+
+    async def run(self, name: str) -> dict:
+        task = self.tasks[name]
+        # de a una tarea por vez, nunca dos compitiendo por el lock de escritura
+        async with self._lock:
+            task.running = True
+            task.last_started = datetime.now(timezone.utc)
+            started = time.perf_counter()
+            try:
+                task.last_result = await asyncio.to_thread(task.func)
+                task.last_status = "ok"
+                task.last_error = None
+            except Exception as e:
+                logger.exception("Maintenance task %s failed", name)
+                task.last_status = "error"
+                task.last_error = repr(e)
+            finally:
+                task.running = False
+                task.runs += 1
+                task.last_duration_ms = (time.perf_counter() - started) * 1000
+                task.next_run = time.monotonic() + task.interval
+        return task.status()
+
+    def status(self) -> dict[str, dict]:
+        return {name: task.status() for name, task in self.tasks.items()}
+
+maintenance = MaintenanceScheduler()
+maintenance.add("optimize", OPTIMIZE_INTERVAL, optimize)
+maintenance.add("wal_checkpoint", CHECKPOINT_INTERVAL, checkpoint)
+maintenance.add("incremental_vacuum", VACUUM_INTERVAL, incremental_vacuum)
+maintenance.add("archive", ARCHIVE_INTERVAL, archive)
+maintenance.add("backup", BACKUP_INTERVAL, backup, last_backup_at)
+maintenance.add("refresh_tokens", TOKENS_INTERVAL, prune_tokens)
+maintenance.add("idempotency_keys", IDEMPOTENCY_INTERVAL, prune_idempotency)
+maintenance.add("outbox_jobs", JOBS_INTERVAL, prune_outbox)
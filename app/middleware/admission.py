@@ -0,0 +1,116 @@
+import asyncio
+import re
+from typing import cast
+
+from decouple import config
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+MAX_QUEUE_WAIT = cast(float, config("ADMISSION_MAX_QUEUE_WAIT", default=1.0, cast=float))
+RETRY_AFTER = cast(int, config("ADMISSION_RETRY_AFTER", default=1, cast=int))
+
+# rutas que nunca se limitan: las métricas y el admin (para poder usarlos aunque la api esté
+# saturada) y los streams sse, que quedan abiertos y ocuparían un lugar para siempre
+EXEMPT_PATHS = re.compile(r"^/(docs|redoc|openapi\.json|metrics|admin|sse)(/.*)?$")
+
+# cada grupo: (nombre, métodos, patrón de la ruta). Gana el primero que coincide
+ROUTE_CLASSES: list[tuple[str, set[str], re.Pattern[str]]] = [
+    ("auth", {"POST"}, re.compile(r"^/mechanic/(login|signup)$")),
+    # los batch-get son lecturas aunque vengan por POST
+    ("search", {"POST"}, re.compile(r"^/(clients|vehicles|repairs|mechanics)/batch-get$")),
+    ("history", {"GET"}, re.compile(r"^/(vehicles|mechanics)/[^/]+/(repairs/?|history)$|^/reports/")),
+    ("search", {"GET"}, re.compile(r".*")),
+    ("write", {"POST", "PUT", "PATCH", "DELETE"}, re.compile(r".*")),
+]
+
+class RouteLimiter:
+    def __init__(self, name: str, limit: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        self.queued += 1
+        try:
+            if self.max_wait <= 0:
+                if self.semaphore.locked():
+                    raise asyncio.TimeoutError
+                await self.semaphore.acquire()
+            else:
+                await asyncio.wait_for(self.semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.queued -= 1
+
+        self.admitted += 1
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def stats(self) -> dict:
+        total = self.admitted + self.rejected
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "rejection_rate": self.rejected / total if total else 0.0
+        }
+
+limiters: dict[str, RouteLimiter] = {
+    "auth": RouteLimiter("auth", cast(int, config("ADMISSION_AUTH_LIMIT", default=4, cast=int)), MAX_QUEUE_WAIT),
+    "search": RouteLimiter("search", cast(int, config("ADMISSION_SEARCH_LIMIT", default=32, cast=int)), MAX_QUEUE_WAIT),
+    "history": RouteLimiter("history", cast(int, config("ADMISSION_HISTORY_LIMIT", default=8, cast=int)), MAX_QUEUE_WAIT),
+    "write": RouteLimiter("write", cast(int, config("ADMISSION_WRITE_LIMIT", default=8, cast=int)), MAX_QUEUE_WAIT),
+}
+
+def classify(method: str, path: str) -> str | None:
+    if EXEMPT_PATHS.match(path):
+        return None
+    for name, methods, pattern in ROUTE_CLASSES:
+        if method in methods and pattern.match(path):
+            return name
+    return None
+
+def admission_stats() -> dict[str, dict]:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+class AdmissionControlMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[route_class]
+        if not await limiter.acquire():
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Server overloaded ({route_class}), retry later"},
+                headers={"Retry-After": str(RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,68 @@
+from typing import cast
+
+from decouple import config
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError: # brotli es opcional, sin él solo se usa gzip
+    brotli = None
+
+# los niveles altos cuestan mucho más cpu y casi no achican un JSON de unos KB más que el nivel 6
+MAX_LEVEL = 6
+
+COMPRESSION_MIN_SIZE = cast(int, config("COMPRESSION_MIN_SIZE", default=1024, cast=int))
+COMPRESSION_GZIP_LEVEL = min(cast(int, config("COMPRESSION_GZIP_LEVEL", default=5, cast=int)), MAX_LEVEL)
+COMPRESSION_BROTLI_QUALITY = min(cast(int, config("COMPRESSION_BROTLI_QUALITY", default=4, cast=int)), MAX_LEVEL)
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality) # type: ignore
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    # "gzip, deflate, br;q=0" -> {"gzip", "deflate"}
+    encodings = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip() and weight > 0:
+            encodings.add(name.strip())
+    return encodings
+
+class CompressionMiddleware:
+    # mismo comportamiento que el GZipMiddleware de starlette (no toca respuestas chicas,
+    # ya comprimidas ni text/event-stream, así el sse no se bufferea), más brotli
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        responder: ASGIApp
+        if brotli is not None and COMPRESSION_BROTLI_QUALITY > 0 and "br" in encodings:
+            responder = BrotliResponder(self.app, COMPRESSION_MIN_SIZE, COMPRESSION_BROTLI_QUALITY)
+        elif COMPRESSION_GZIP_LEVEL > 0 and "gzip" in encodings:
+            responder = GZipResponder(self.app, COMPRESSION_MIN_SIZE, compresslevel=COMPRESSION_GZIP_LEVEL)
+        else:
+            responder = IdentityResponder(self.app, COMPRESSION_MIN_SIZE)
+        await responder(scope, receive, send)
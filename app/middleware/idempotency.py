@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import cast
+
+from decouple import config
+from sqlalchemy import Engine
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, delete, update, col
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.auth_handler import decode_jwt
+from app.db import engine
+from app.models import IdempotencyKey
+
+IDEMPOTENCY_TTL = cast(int, config("IDEMPOTENCY_TTL", default=86400, cast=int))
+IDEMPOTENCY_MAX_KEYS = cast(int, config("IDEMPOTENCY_MAX_KEYS", default=50000, cast=int))
+# cuánto espera un duplicado a que termine el request original antes de devolver 409
+IDEMPOTENCY_WAIT = cast(float, config("IDEMPOTENCY_WAIT", default=10.0, cast=float))
+# si el worker se cae con un request en curso, la clave se libera sola después de esto
+IDEMPOTENCY_PENDING_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+# los POST de alta; un reintento con la misma Idempotency-Key devuelve la respuesta guardada
+IDEMPOTENT_ROUTES = re.compile(r"^/(clients/|clients/[^/]+/vehicles/|vehicle/[^/]+/[^/]+/repairs/)$")
+
+def claim(engine: Engine, key: str, request_hash: str) -> IdempotencyKey | None:
+    # devuelve None si la clave quedó tomada por este request, o la fila existente si no
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        # los reintentos casi siempre encuentran la fila: se lee primero, sin tomar el lock de escritura
+        existing = session.exec(
+            select(IdempotencyKey).where(IdempotencyKey.key==key, col(IdempotencyKey.expires_at) >= now)
+        ).one_or_none()
+        if existing:
+            session.expunge(existing)
+            return existing
+
+        session.execute(delete(IdempotencyKey).where(col(IdempotencyKey.key)==key, col(IdempotencyKey.expires_at) < now))
+        result = session.execute(
+            insert(IdempotencyKey)
+            .values(key=key, request_hash=request_hash, created_at=now,
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT))
+            .on_conflict_do_nothing()
+        )
+        session.commit()
+        if result.rowcount: # type: ignore
+            return None
+        existing = session.get(IdempotencyKey, key)
+        if existing:
+            session.expunge(existing)
+        return existing
+
+def complete(engine: Engine, key: str, status_code: int, headers: list[tuple[str, str]], body: bytes):
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        session.execute(
+            update(IdempotencyKey)
+            .where(col(IdempotencyKey.key)==key)
+            .values(status_code=status_code, headers=json.dumps(headers), body=body,
+                    expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL))
+        )
+        session.commit()
+
+def release(engine: Engine, key: str):
+    with Session(engine) as session:
+        session.execute(delete(IdempotencyKey).where(col(IdempotencyKey.key)==key))
+        session.commit()
+
+def prune_idempotency_keys(engine: Engine) -> dict:
+    with Session(engine) as session:
+        expired = session.execute(delete(IdempotencyKey).where(col(IdempotencyKey.expires_at) < datetime.now(timezone.utc)))
+        # tope de filas: si se pasa, se van las más viejas
+        oldest_kept = select(IdempotencyKey.created_at).order_by(col(IdempotencyKey.created_at).desc()).offset(IDEMPOTENCY_MAX_KEYS).limit(1)
+        over = session.execute(delete(IdempotencyKey).where(col(IdempotencyKey.created_at) <= oldest_kept.scalar_subquery()))
+        session.commit()
+    return {"expired": expired.rowcount, "over_limit": over.rowcount} # type: ignore
+
+def replay(record: IdempotencyKey) -> Response:
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers or "[]")]
+    response = Response(content=record.body or b"", status_code=record.status_code or 200)
+    response.raw_headers = [*headers, (b"idempotent-replayed", b"true")]
+    return response
+
+class IdempotencyMiddleware:
+    # va por fuera del control de admisión: los reintentos repetidos y los que esperan al
+    # original no ocupan lugares de escritura
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not IDEMPOTENT_ROUTES.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        # las claves son por mecánico; sin token válido el endpoint igual devuelve 401
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        payload = decode_jwt(token) if idempotency_key and scheme.lower() == "bearer" and token else None
+        if not payload:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > 255: # type: ignore
+            await JSONResponse(status_code=400, content={"detail": "Idempotency-Key too long"})(scope, receive, send)
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        key = f"{payload['sub']}:{idempotency_key}"
+        request_hash = hashlib.sha256(b"\n".join([scope["path"].encode(), scope["query_string"], body])).hexdigest()
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT
+        while True:
+            existing = await asyncio.to_thread(claim, engine, key, request_hash)
+            if existing is None:
+                break
+            if existing.request_hash != request_hash:
+                response = JSONResponse(status_code=422, content={"detail": "Idempotency-Key already used with a different request"})
+                await response(scope, receive, send)
+                return
+            if existing.status_code is not None:
+                await replay(existing)(scope, receive, send)
+                return
+            if time.monotonic() >= deadline:
+                response = JSONResponse(
+                    status_code=409,
+                    content={"detail": "A request with this Idempotency-Key is still in progress"},
+                    headers={"Retry-After": "1"}
+                )
+                await response(scope, receive, send)
+                return
+            await asyncio.sleep(POLL_INTERVAL)
+
+        await self.run_and_store(scope, receive, send, body, key)
+
+    async def run_and_store(self, scope: Scope, receive: Receive, send: Send, body: bytes, key: str):
+        # sin accept-encoding la respuesta se guarda sin comprimir y sirve para cualquier reintento
+        scope = {**scope, "headers": [(name, value) for name, value in scope["headers"] if name != b"accept-encoding"]}
+        body_sent = False
+
+        async def receive_body() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        response_headers: list[tuple[str, str]] = []
+        chunks: list[bytes] = []
+
+        async def send_and_capture(message: Message):
+            nonlocal status_code, response_headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        finally:
+            # los 5xx (incluido el 503 del control de admisión) no se guardan: el reintento se vuelve a ejecutar
+            if status_code < 500:
+                await asyncio.to_thread(complete, engine, key, status_code, response_headers, b"".join(chunks))
+            else:
+                await asyncio.to_thread(release, engine, key)
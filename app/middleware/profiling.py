@@ -0,0 +1,165 @@
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import time
+from datetime import datetime, timezone
+from typing import Coroutine, cast
+
+from decouple import config
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.auth_handler import ADMIN_EMAILS, decode_jwt
+
+PROFILING_DIR = cast(str, config("PROFILING_DIR", default="profiles"))
+PROFILING_KEEP = cast(int, config("PROFILING_KEEP", default=200, cast=int))
+PROFILE_HEADER = "x-profile"
+
+# los streams sse quedan abiertos y tendrían el profiler prendido para siempre
+EXCLUDED_PATHS = re.compile(r"^/(sse|admin/profil)")
+
+# nombre de archivo seguro para usar en /admin/profiles/{profile_id}
+PROFILE_ID = re.compile(r"^[\w.-]+$")
+
+# apagado por defecto. Prendido, se perfila un request si trae "X-Profile: 1" con el token de
+# un admin, o al azar con probabilidad sample_rate. Se puede cambiar en caliente desde /admin/profiling
+settings = {
+    "enabled": cast(bool, config("PROFILING_ENABLED", default=False, cast=bool)),
+    "sample_rate": cast(float, config("PROFILING_SAMPLE_RATE", default=0.0, cast=float))
+}
+
+def requested_by_admin(headers: Headers) -> bool:
+    if headers.get(PROFILE_HEADER) != "1":
+        return False
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    payload = decode_jwt(token) if scheme.lower() == "bearer" and token else None
+    return bool(payload) and str(payload.get("email", "")).lower() in ADMIN_EMAILS # type: ignore
+
+def route_of(scope: Scope) -> str:
+    # el template de la ruta ("/vehicles/{vehicle_id}"), lo deja fastapi en el scope al rutear
+    return getattr(scope.get("route"), "path", scope["path"])
+
+def new_profile_id(started_at: datetime, method: str, route: str) -> str:
+    slug = re.sub(r"[^\w]+", "_", route).strip("_") or "root"
+    return f"{started_at.strftime('%Y%m%d-%H%M%S-%f')}-{method}-{slug}"
+
+def save_profile(profiler: cProfile.Profile, profile_id: str, meta: dict):
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILING_DIR, f"{profile_id}.prof"))
+    with open(os.path.join(PROFILING_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump({"id": profile_id, **meta}, f)
+
+    profiles = sorted(name[:-5] for name in os.listdir(PROFILING_DIR) if name.endswith(".json"))
+    for old in profiles[:-PROFILING_KEEP]:
+        for ext in (".prof", ".json"):
+            path = os.path.join(PROFILING_DIR, old + ext)
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_profiles(route: str | None = None) -> list[dict]:
+    if not os.path.isdir(PROFILING_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILING_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(PROFILING_DIR, name)) as f:
+            meta = json.load(f)
+        if route is None or meta["route"] == route:
+            profiles.append(meta)
+    return profiles
+
+def profile_path(profile_id: str) -> str | None:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILING_DIR, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+def profile_text(path: str, limit: int = 50) -> str:
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+class ProfiledStep:
+    # cProfile se engancha a todo el thread del event loop. Para no mezclar otros requests se
+    # prende solo mientras avanza la corrutina de este request y se apaga cada vez que se
+    # suspende (await de io, de otro task, etc.), que es justo cuando corren los demás
+    def __init__(self, coro: Coroutine, profiler: cProfile.Profile):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                yielded = self.coro.send(value) if error is None else self.coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self.coro.close()
+                raise
+            except BaseException as e:
+                # cancelaciones y errores que el event loop manda a la corrutina
+                value, error = None, e
+
+class ProfilingMiddleware:
+    # se mide lo que hace este request en el event loop: dependencias, validación de pydantic y
+    # las consultas de los endpoints async. Lo que corre en el threadpool (endpoints def) o en
+    # tasks aparte no aparece
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # un solo profiler activo a la vez; mientras tanto los demás requests corren normal
+        self.busy = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings["enabled"] or self.busy or EXCLUDED_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        sampled = settings["sample_rate"] > 0 and random.random() < settings["sample_rate"]
+        if not sampled and not requested_by_admin(headers):
+            await self.app(scope, receive, send)
+            return
+
+        started_at = datetime.now(timezone.utc)
+        status_code = 0
+        profile_id = None
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status_code, profile_id
+            if message["type"] == "http.response.start":
+                # para que quien pidió el perfil sepa cuál bajar de /admin/profiles
+                status_code = message["status"]
+                profile_id = new_profile_id(started_at, scope["method"], route_of(scope))
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        self.busy = True
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            await ProfiledStep(self.app(scope, receive, send_with_profile_id), profiler) # type: ignore
+        finally:
+            self.busy = False
+            meta = {
+                "route": route_of(scope),
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "duration_ms": (time.perf_counter() - started) * 1000,
+                "trigger": "sample" if sampled else "header",
+                "created_at": started_at.isoformat()
+            }
+            profile_id = profile_id or new_profile_id(started_at, scope["method"], meta["route"])
+            await asyncio.to_thread(save_profile, profiler, profile_id, meta)
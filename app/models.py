@@ -1,7 +1,7 @@
 from pydantic import EmailStr
 from sqlmodel import Field, SQLModel, Relationship
 from uuid import UUID, uuid4
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 from app.schemas.repairs import RepairStatus
 
@@ -29,6 +29,7 @@ class Client(SQLModel, table=True):
 class Vehicle(SQLModel, table=True):
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     license_plate: str = Field(index=True, unique=True)
+    plate_key: str = Field(default="", index=True) # patente normalizada, ver normalize_plate
     brand: str = Field(index=True)
     model: str = Field(index=True)
     year: int = Field(index=True)
@@ -66,3 +67,111 @@ class Record(SQLModel, table=True):
     repair_id: UUID = Field(foreign_key="repairs.id")
     repairs: Repairs | None = Relationship(back_populates="records")
 
+
+class RepairRollup(SQLModel, table=True):
+    day: date = Field(primary_key=True)
+    mechanic_id: UUID = Field(primary_key=True)
+    brand: str = Field(primary_key=True)
+    opened: int = Field(default=0)
+    finished: int = Field(default=0)
+    delivered: int = Field(default=0)
+
+
+class VehicleHistorySnapshot(SQLModel, table=True):
+    vehicle_id: UUID = Field(primary_key=True)
+    client_id: UUID = Field(index=True)
+    version: int = Field(default=0)
+    document: Optional[str] = Field(default=None)
+
+
+class OutboxJob(SQLModel, table=True):
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    kind: str = Field(index=True)
+    payload: str
+    status: str = Field(index=True, default="pending") # pending | running | done | failed
+    attempts: int = Field(default=0)
+    available_at: datetime = Field(index=True)
+    locked_until: Optional[datetime] = Field(default=None, nullable=True)
+    last_error: Optional[str] = Field(default=None, nullable=True)
+    created_at: datetime
+    finished_at: Optional[datetime] = Field(default=None, nullable=True)
+
+
+class Notification(SQLModel, table=True):
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    dedup_key: str = Field(unique=True, index=True)
+    kind: str = Field(index=True)
+    message: str
+    created_at: datetime
+
+    client_id: UUID = Field(foreign_key="client.id", index=True)
+    repair_id: Optional[UUID] = Field(default=None, foreign_key="repairs.id")
+
+
+class RepairEvent(SQLModel, table=True):
+    __table_args__ = {"sqlite_autoincrement": True} # los ids no se reutilizan aunque se borren eventos viejos
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str # created | updated | deleted
+    repair_id: UUID = Field(index=True)
+    mechanic_id: UUID = Field(index=True)
+    status: str
+    payload: str
+    created_at: datetime = Field(index=True)
+
+
+# tablas de archivo: filas borradas (soft delete) y reparaciones entregadas hace tiempo,
+# movidas fuera de las tablas principales por app.archive. Mismas columnas + archived_at
+
+class ClientArchive(SQLModel, table=True):
+    id: UUID = Field(primary_key=True)
+    name: str
+    phone_number: str
+    email: str
+    deleted_at: Optional[datetime] = Field(default=None, nullable=True)
+    archived_at: datetime
+
+
+class VehicleArchive(SQLModel, table=True):
+    id: UUID = Field(primary_key=True)
+    license_plate: str
+    plate_key: str
+    brand: str
+    model: str
+    year: int
+    deleted_at: Optional[datetime] = Field(default=None, nullable=True)
+    client_id: UUID = Field(index=True)
+    archived_at: datetime
+
+
+class RepairsArchive(SQLModel, table=True):
+    id: UUID = Field(primary_key=True)
+    description: Optional[str] = Field(default=None)
+    status: RepairStatus
+    start_date: datetime
+    finish_date: datetime
+    deleted_at: Optional[datetime] = Field(default=None, nullable=True)
+    mechanic_id: UUID = Field(index=True)
+    vehicle_id: UUID = Field(index=True)
+    archived_at: datetime
+
+
+class RefreshToken(SQLModel, table=True):
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    token_hash: str = Field(unique=True, index=True)
+    family_id: UUID = Field(index=True)
+    mechanic_id: UUID = Field(foreign_key="mechanic.id", index=True)
+    created_at: datetime
+    expires_at: datetime
+    revoked_at: Optional[datetime] = Field(default=None, nullable=True)
+    replaced_by: Optional[UUID] = Field(default=None, nullable=True)
+
+
+class IdempotencyKey(SQLModel, table=True):
+    key: str = Field(primary_key=True) # "<mechanic_id>:<Idempotency-Key>"
+    request_hash: str
+    status_code: Optional[int] = Field(default=None, nullable=True) # None = todavía en curso
+    headers: Optional[str] = Field(default=None, nullable=True)
+    body: Optional[bytes] = Field(default=None, nullable=True)
+    created_at: datetime = Field(index=True)
+    expires_at: datetime = Field(index=True)
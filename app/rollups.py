@@ -0,0 +1,153 @@
+from collections import Counter
+from datetime import date, datetime
+from typing import cast
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from decouple import config
+from sqlalchemy import Engine
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session, select, delete, func, union_all
+
+from app.models import Repairs, Vehicle, Record, RepairRollup, RepairsArchive, VehicleArchive
+from app.schemas.repairs import RepairStatus
+
+# rollup diario de reparaciones por mecánico y marca. Se mantiene incrementalmente desde
+# save_repair_in_db, update_info y delete_repair, y se puede reconstruir entero con:
+#   python -m app.rollups
+# opened = por start_date; finished / delivered = día (hora del taller) en que la reparación pasó a "ready" / "delivered"
+
+COUNTED_STATUSES = {RepairStatus.listo: "finished", RepairStatus.entregado: "delivered"}
+
+# start_date / finish_date son hora local del taller sin zona (ver app.intervals). Los cambios de
+# estado se fechan igual, así caen en el mismo día del reporte. Vacío = hora local del servidor
+SHOP_TIMEZONE = cast(str, config("SHOP_TIMEZONE", default=""))
+
+def shop_now() -> datetime:
+    if SHOP_TIMEZONE:
+        return datetime.now(ZoneInfo(SHOP_TIMEZONE)).replace(tzinfo=None)
+    return datetime.now()
+
+def bump(session: Session, day: date, mechanic_id: UUID, brand: str, opened: int = 0, finished: int = 0, delivered: int = 0):
+    stmt = insert(RepairRollup).values(
+        day=day, mechanic_id=mechanic_id, brand=brand,
+        opened=opened, finished=finished, delivered=delivered
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "mechanic_id", "brand"],
+        set_={
+            "opened": RepairRollup.opened + stmt.excluded.opened,
+            "finished": RepairRollup.finished + stmt.excluded.finished,
+            "delivered": RepairRollup.delivered + stmt.excluded.delivered
+        }
+    )
+    session.execute(stmt)
+
+def repair_opened(session: Session, repair: Repairs, brand: str):
+    bump(session, repair.start_date.date(), repair.mechanic_id, brand, opened=1)
+
+def repair_status_changed(session: Session, repair: Repairs, brand: str, previous: list[tuple[date, str]]):
+    # previous = repair_buckets antes del cambio. Se aplica la diferencia y no solo el estado nuevo:
+    # una reparación vieja sin historial deja de contar por finish_date cuando cambia de estado
+    delta = Counter(repair_buckets(session, repair))
+    delta.subtract(previous)
+    for (day, counter), count in delta.items():
+        if count:
+            bump(session, day, repair.mechanic_id, brand, **{counter: count})
+
+def repair_buckets(session: Session, repair: Repairs | RepairsArchive) -> list[tuple[date, str]]:
+    # (día, contador) que la reparación suma al rollup, con el mismo criterio que rebuild_rollups:
+    # su alta y cada paso a ready / delivered
+    buckets = [(repair.start_date.date(), "opened")]
+    recorded = set()
+    for record in session.exec(select(Record).where(Record.repair_id==repair.id)).all():
+        counter = COUNTED_STATUSES.get(RepairStatus(record.status))
+        if counter:
+            buckets.append((record.date.date(), counter))
+            recorded.add(counter)
+    # reparaciones viejas, de antes del historial: cuentan por finish_date
+    counter = COUNTED_STATUSES.get(RepairStatus(repair.status))
+    if counter and counter not in recorded:
+        buckets.append((repair.finish_date.date(), counter))
+    return buckets
+
+def repair_removed(session: Session, repair: Repairs, brand: str):
+    for day, counter in repair_buckets(session, repair):
+        bump(session, day, repair.mechanic_id, brand, **{counter: -1})
+
+def vehicle_brand_changed(session: Session, vehicle_id: UUID, old_brand: str, new_brand: str):
+    # mueve a la marca nueva lo que las reparaciones del vehículo sumaron con la vieja,
+    # en la misma transacción que el cambio del vehículo
+    if old_brand == new_brand:
+        return
+    repairs = [
+        *session.exec(select(Repairs).where(Repairs.vehicle_id==vehicle_id, Repairs.deleted_at==None)).all(),
+        *session.exec(select(RepairsArchive).where(RepairsArchive.vehicle_id==vehicle_id, RepairsArchive.deleted_at==None)).all()
+    ]
+    for repair in repairs:
+        for day, counter in repair_buckets(session, repair):
+            bump(session, day, repair.mechanic_id, old_brand, **{counter: -1})
+            bump(session, day, repair.mechanic_id, new_brand, **{counter: 1})
+
+def active_repairs():
+    # reparaciones no borradas de la tabla principal y del archivo, con la marca del vehículo
+    repairs = union_all(
+        select(Repairs.id, Repairs.status, Repairs.start_date, Repairs.finish_date, Repairs.mechanic_id, Repairs.vehicle_id)
+        .where(Repairs.deleted_at==None),
+        select(RepairsArchive.id, RepairsArchive.status, RepairsArchive.start_date, RepairsArchive.finish_date,
+               RepairsArchive.mechanic_id, RepairsArchive.vehicle_id)
+        .where(RepairsArchive.deleted_at==None)
+    ).subquery()
+    vehicles = union_all(
+        select(Vehicle.id, Vehicle.brand),
+        select(VehicleArchive.id, VehicleArchive.brand)
+    ).subquery()
+    return repairs, vehicles
+
+def rebuild_rollups(session: Session):
+    session.execute(delete(RepairRollup))
+    repairs, vehicles = active_repairs()
+    keys = (repairs.c.mechanic_id, vehicles.c.brand)
+
+    def add(day_column, query, counter: str):
+        rows = session.exec(
+            query.add_columns(day_column, *keys, func.count())
+            .join(vehicles, vehicles.c.id==repairs.c.vehicle_id)
+            .group_by(day_column, *keys)
+        ).all()
+        for day, mechanic_id, brand, count in rows:
+            bump(session, date.fromisoformat(day), mechanic_id, brand, **{counter: count})
+
+    add(func.date(repairs.c.start_date), select().select_from(repairs), "opened")
+
+    for status, counter in COUNTED_STATUSES.items():
+        add(
+            func.date(Record.date),
+            select().select_from(Record).join(repairs, repairs.c.id==Record.repair_id).where(Record.status==status.value),
+            counter
+        )
+
+        # reparaciones viejas, de antes de que update_info guardara el historial: se usa finish_date
+        has_record = select(Record.id).where(Record.repair_id==repairs.c.id, Record.status==status.value).exists()
+        add(
+            func.date(repairs.c.finish_date),
+            select().select_from(repairs).where(repairs.c.status==status, ~has_record),
+            counter
+        )
+
+def create_rollups(engine: Engine):
+    with Session(engine) as session:
+        if session.exec(select(RepairRollup.day).limit(1)).first() is not None:
+            return
+        if session.exec(select(Repairs.id).limit(1)).first() is None:
+            return
+        rebuild_rollups(session)
+        session.commit()
+
+if __name__ == "__main__":
+    from app.db import engine
+
+    with Session(engine) as session:
+        rebuild_rollups(session)
+        session.commit()
+    print("Rollups rebuilt")
@@ -0,0 +1,13 @@
+from typing import Generic, Optional, TypeVar
+from pydantic import BaseModel, Field
+from uuid import UUID
+
+T = TypeVar("T")
+
+class BatchGet(BaseModel):
+    ids: list[UUID] = Field(min_length=1, max_length=1000)
+
+class BatchItem(BaseModel, Generic[T]):
+    id: UUID
+    found: bool
+    data: Optional[T] = None
@@ -0,0 +1,32 @@
+from typing import Optional
+from pydantic import BaseModel
+from datetime import datetime
+from uuid import UUID
+
+from app.schemas.client import ClientRead
+from app.schemas.vehicle import VehicleRead
+from app.schemas.mechanic import MechanicRead
+from app.schemas.repairs import RepairStatus
+
+class StatusChange(BaseModel):
+    date: datetime
+    status: str
+    description: str
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class RepairHistory(BaseModel):
+    id: UUID
+    description: Optional[str] = None
+    status: RepairStatus
+    start_date: datetime
+    finish_date: datetime
+    mechanic: Optional[MechanicRead] = None
+    timeline: list[StatusChange] = []
+
+class VehicleHistory(BaseModel):
+    vehicle: VehicleRead
+    owner: Optional[ClientRead] = None
+    repairs: list[RepairHistory] = []
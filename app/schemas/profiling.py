@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(default=0.0, ge=0, le=1)
+
+class ProfileInfo(BaseModel):
+    id: str
+    route: str
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    trigger: str
+    created_at: str
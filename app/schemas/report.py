@@ -0,0 +1,22 @@
+from typing import Optional
+from pydantic import BaseModel
+from datetime import date
+from uuid import UUID
+from enum import Enum
+
+class Granularity(str, Enum):
+    day = "day"
+    week = "week"
+    month = "month"
+
+class ReportGroup(str, Enum):
+    mechanic = "mechanic"
+    brand = "brand"
+
+class RepairReportRow(BaseModel):
+    period: date
+    mechanic_id: Optional[UUID] = None
+    brand: Optional[str] = None
+    opened: int
+    finished: int
+    delivered: int
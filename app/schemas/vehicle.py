@@ -1,7 +1,12 @@
+import re
 from typing import Optional
 from pydantic import BaseModel
 from uuid import UUID
 
+def normalize_plate(plate: str) -> str:
+    # "ab-123", "AB 123" y "AB123" son la misma patente
+    return re.sub(r"[^A-Z0-9]", "", plate.upper())
+
 class VehicleCreate(BaseModel):
     license_plate: str
     brand: str
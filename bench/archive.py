@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+# tamaño de la tabla caliente y consultas sobre repairs antes y después de archivar
+# (python -m app.archive). Casi todo lo viejo está entregado, como en un taller real.
+# uso: python bench/archive.py [--repairs 200000] [--vehicles 20000]
+
+# la app abre database.db en el directorio actual: la base del benchmark va a un directorio temporal
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+os.chdir(workdir)
+os.environ.setdefault("secret", "bench")
+os.environ.setdefault("algorithm", "HS256")
+os.environ.setdefault("MECHANIC_REGISTRATION_CODE", "bench")
+os.environ.setdefault("ARCHIVE_BATCH_SIZE", "2000")
+
+from sqlmodel import Session, select, func
+
+from app.archive import archive_cold_rows
+from app.db import engine, create_db_and_tables
+from app.handlers.repair_handler import get_record_of_repairs
+from app.intervals import create_interval_index
+from app.models import Client, Mechanic, Repairs, Vehicle
+from app.schemas.repairs import RepairStatus
+
+def populate(repairs: int, vehicles: int) -> list:
+    create_db_and_tables()
+    now = datetime.now()
+    with Session(engine) as session:
+        mechanic_ids = [uuid4() for _ in range(50)]
+        session.bulk_insert_mappings(Mechanic, [ # type: ignore
+            dict(id=mechanic_id, name=f"m{i}", email=f"m{i}@bench.com", password="x", phone="1")
+            for i, mechanic_id in enumerate(mechanic_ids)
+        ])
+        client = Client(name="bench", phone_number="1", email="bench@bench.com")
+        session.add(client)
+        session.commit()
+        vehicle_ids = [uuid4() for _ in range(vehicles)]
+        session.bulk_insert_mappings(Vehicle, [ # type: ignore
+            dict(id=vehicle_id, license_plate=vehicle_id.hex[:10], plate_key=vehicle_id.hex[:10].upper(),
+                 brand="Ford", model="Focus", year=2020, client_id=client.id)
+            for vehicle_id in vehicle_ids
+        ])
+        rows = []
+        for _ in range(repairs):
+            # 6 años de historia: 95% de lo que tiene más de un mes está entregado y un 3% borrado
+            start_date = now - timedelta(days=random.randint(0, 365 * 6))
+            roll = random.random()
+            delivered = start_date < now - timedelta(days=30) and roll < 0.95
+            rows.append(dict(
+                id=uuid4(), description="bench", start_date=start_date, finish_date=start_date + timedelta(hours=3),
+                status=RepairStatus.entregado if delivered else RepairStatus.pendiente,
+                deleted_at=now if roll > 0.97 else None,
+                mechanic_id=random.choice(mechanic_ids), vehicle_id=random.choice(vehicle_ids)
+            ))
+        session.bulk_insert_mappings(Repairs, rows) # type: ignore
+        session.commit()
+    with engine.begin() as connection:
+        create_interval_index(connection)
+    return vehicle_ids
+
+async def measure(label: str, sample: list):
+    with Session(engine) as session:
+        hot = session.exec(select(func.count()).select_from(Repairs)).one()
+
+        started = time.perf_counter()
+        for vehicle_id in sample:
+            await get_record_of_repairs(session, vehicle_id)
+        record = (time.perf_counter() - started) / len(sample) * 1000
+
+        started = time.perf_counter()
+        for vehicle_id in sample:
+            await get_record_of_repairs(session, vehicle_id, include_archived=True)
+        with_archive = (time.perf_counter() - started) / len(sample) * 1000
+
+        # trabajo abierto: lo que más se lee de la tabla caliente
+        started = time.perf_counter()
+        for _ in range(20):
+            session.exec(select(Repairs).where(Repairs.deleted_at==None, Repairs.status==RepairStatus.pendiente).limit(100)).all()
+        open_work = (time.perf_counter() - started) / 20 * 1000
+
+    print(f"  {label}: hot repairs {hot:7d}   get_record_of_repairs {record:6.2f} ms "
+          f"(include_archived {with_archive:6.2f} ms)   open work scan {open_work:6.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repairs", type=int, default=200_000)
+    parser.add_argument("--vehicles", type=int, default=20_000)
+    parser.add_argument("--sample", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{args.repairs} repairs on {args.vehicles} vehicles")
+    vehicle_ids = populate(args.repairs, args.vehicles)
+    sample = random.sample(vehicle_ids, min(args.sample, len(vehicle_ids)))
+
+    asyncio.run(measure("before", sample))
+    started = time.perf_counter()
+    moved = archive_cold_rows(engine)
+    print(f"  archived {moved} in {time.perf_counter() - started:.1f} s")
+    asyncio.run(measure("after ", sample))
+
+if __name__ == "__main__":
+    main()
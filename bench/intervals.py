@@ -0,0 +1,102 @@
+import argparse
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+# solapamiento de reparaciones por mecánico y mecánicos ocupados en un rango:
+# consulta por rango de fechas sobre repairs (como antes) contra el R*Tree de app.intervals.
+# uso: python bench/intervals.py [--repairs 300000] [--mechanics 200]
+
+# la app abre database.db en el directorio actual: la base del benchmark va a un directorio temporal
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+os.chdir(workdir)
+os.environ.setdefault("secret", "bench")
+os.environ.setdefault("algorithm", "HS256")
+os.environ.setdefault("MECHANIC_REGISTRATION_CODE", "bench")
+
+from sqlmodel import Session, select
+
+from app.db import engine, create_db_and_tables
+from app.intervals import busy_mechanic_ids, create_interval_index, find_overlaps, get_mechanic_rowid
+from app.models import Mechanic, Repairs
+from app.schemas.repairs import RepairStatus
+
+def populate(repairs: int, mechanics: int):
+    create_db_and_tables()
+    start = datetime(2020, 1, 1)
+    with Session(engine) as session:
+        mechanic_ids = [uuid4() for _ in range(mechanics)]
+        session.bulk_insert_mappings(Mechanic, [ # type: ignore
+            dict(id=mechanic_id, name=f"m{i}", email=f"m{i}@bench.com", password="x", phone="1")
+            for i, mechanic_id in enumerate(mechanic_ids)
+        ])
+        vehicle_id = uuid4()
+        rows = []
+        for _ in range(repairs):
+            # 5 años de fechas, reparaciones de 1 a 48 horas
+            start_date = start + timedelta(hours=random.randint(0, 24 * 365 * 5))
+            rows.append(dict(
+                id=uuid4(), description="bench", status=RepairStatus.pendiente, start_date=start_date,
+                finish_date=start_date + timedelta(hours=random.randint(1, 48)),
+                mechanic_id=random.choice(mechanic_ids), vehicle_id=vehicle_id
+            ))
+        session.bulk_insert_mappings(Repairs, rows) # type: ignore
+        session.commit()
+    # con el índice vacío create_interval_index hace el backfill de todas las filas
+    with engine.begin() as connection:
+        create_interval_index(connection)
+
+def timed(label: str, fn, runs: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    elapsed = (time.perf_counter() - started) / runs * 1000
+    print(f"  {label:28s} {elapsed:8.2f} ms")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repairs", type=int, default=300_000)
+    parser.add_argument("--mechanics", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.repairs} repairs, {args.mechanics} mechanics")
+    populate(args.repairs, args.mechanics)
+
+    query_start = datetime(2023, 3, 1, 10)
+    query_finish = query_start + timedelta(hours=4)
+    with Session(engine) as session:
+        mechanic = session.exec(select(Mechanic)).first()
+        mechanic_row = get_mechanic_rowid(session, mechanic.id) # type: ignore
+
+        range_overlaps = lambda: session.exec(select(Repairs).where(
+            Repairs.mechanic_id==mechanic.id, Repairs.start_date < query_finish, # type: ignore
+            Repairs.finish_date > query_start, Repairs.deleted_at==None
+        )).all()
+        range_busy = lambda: set(session.exec(select(Repairs.mechanic_id).distinct().where(
+            Repairs.start_date < query_finish, Repairs.finish_date > query_start, Repairs.deleted_at==None
+        )).all())
+
+        # los dos caminos tienen que dar lo mismo
+        assert {r.id for r in range_overlaps()} == {r.id for r in find_overlaps(session, mechanic_row, query_start, query_finish)} # type: ignore
+        assert range_busy() == busy_mechanic_ids(session, query_start, query_finish)
+
+        print("per-mechanic overlap")
+        timed("range query", range_overlaps, args.runs)
+        timed("R*Tree", lambda: find_overlaps(session, mechanic_row, query_start, query_finish), args.runs) # type: ignore
+        print("busy mechanics in range")
+        timed("range query", range_busy, args.runs)
+        timed("R*Tree", lambda: busy_mechanic_ids(session, query_start, query_finish), args.runs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+# typeahead de patentes: GET /vehicles/suggest (rango sobre el índice de plate_key) contra el
+# ilike('%x%') sobre license_plate que se usaba antes. Reporta p50 y p99 por prefijo.
+# uso: python bench/plates.py [--vehicles 1000000] [--prefixes 1000]
+
+# la app abre database.db en el directorio actual: la base del benchmark va a un directorio temporal
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+os.chdir(workdir)
+os.environ.setdefault("secret", "bench")
+os.environ.setdefault("algorithm", "HS256")
+os.environ.setdefault("MECHANIC_REGISTRATION_CODE", "bench")
+
+from sqlmodel import Session, select, col
+
+from app.db import engine, create_db_and_tables
+from app.handlers.vehicle_handler import suggest_vehicles
+from app.models import Client, Vehicle
+from app.schemas.vehicle import normalize_plate
+
+def random_plate() -> str:
+    # "AB-123 CD"
+    letters = lambda k: "".join(random.choices(string.ascii_uppercase, k=k))
+    return f"{letters(2)}-{''.join(random.choices(string.digits, k=3))} {letters(2)}"
+
+def populate(vehicles: int):
+    create_db_and_tables()
+    with Session(engine) as session:
+        client = Client(name="bench", phone_number="1", email="bench@bench.com")
+        session.add(client)
+        session.commit()
+        plates: set[str] = set()
+        while len(plates) < vehicles:
+            plates.add(random_plate())
+        session.bulk_insert_mappings(Vehicle, [ # type: ignore
+            dict(id=uuid4(), license_plate=plate, plate_key=normalize_plate(plate), brand="Ford", model="Focus",
+                 year=2020, client_id=client.id)
+            for plate in plates
+        ])
+        session.commit()
+
+def percentiles(label: str, timings: list[float]):
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1000
+    p99 = timings[int(len(timings) * 0.99)] * 1000
+    print(f"  {label:28s} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   ({len(timings)} prefixes)")
+
+async def run(prefixes: list[str], ilike_every: int):
+    with Session(engine) as session:
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            await suggest_vehicles(session, prefix)
+            timings.append(time.perf_counter() - started)
+        percentiles("suggest (plate_key range)", timings)
+
+        # el ilike recorre toda la tabla, se mide sobre una muestra de los prefijos
+        timings = []
+        for prefix in prefixes[::ilike_every]:
+            pattern = f"%{prefix[:2]}-{prefix[2:]}%" if len(prefix) > 2 else f"%{prefix}%"
+            started = time.perf_counter()
+            session.exec(select(Vehicle).where(col(Vehicle.license_plate).ilike(pattern), Vehicle.deleted_at==None).limit(10)).all()
+            timings.append(time.perf_counter() - started)
+        percentiles("ilike '%x%' (before)", timings)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vehicles", type=int, default=1_000_000)
+    parser.add_argument("--prefixes", type=int, default=1000)
+    parser.add_argument("--ilike-every", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.vehicles} vehicles")
+    populate(args.vehicles)
+    # de 2 a 5 caracteres: "AB", "AB1", "AB12", "AB123"
+    prefixes = [
+        "".join(random.choices(string.ascii_uppercase, k=2)) + "".join(random.choices(string.digits, k=random.randint(0, 3)))
+        for _ in range(args.prefixes)
+    ]
+    asyncio.run(run(prefixes, args.ilike_every))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import atexit
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# bytes en el cable y cpu del servidor por request para listas de 100 filas, con y sin ?fields=
+# y con cada Accept-Encoding. Después, cuánto cuesta comprimir cada respuesta con cada nivel.
+# uso: python bench/responses.py [--rows 100] [--runs 300]
+
+# la app abre database.db en el directorio actual: la base del benchmark va a un directorio temporal
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp(prefix="bench-")
+atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+os.chdir(workdir)
+os.environ.setdefault("secret", "bench")
+os.environ.setdefault("algorithm", "HS256")
+os.environ.setdefault("MECHANIC_REGISTRATION_CODE", "bench")
+os.environ.setdefault("MAINTENANCE_OPTIMIZE_INTERVAL", "0")
+
+from fastapi.testclient import TestClient
+
+from app.api import app
+
+try:
+    import brotli
+except ImportError: # sin brotli se mide solo gzip
+    brotli = None
+
+def populate(client: TestClient, rows: int) -> tuple[dict, dict[str, str]]:
+    signup = client.post("/mechanic/signup", json={
+        "name": "bench", "email": "bench@bench.com", "password": "bench", "phone": "1",
+        "registration_code": os.environ["MECHANIC_REGISTRATION_CODE"]
+    }).json()
+    headers = {"Authorization": f"Bearer {signup['access_token']}"}
+    mechanic_id = signup["mechanic"]["id"]
+    client_id = client.post("/clients/", json={"name": "Juan Perez", "phone_number": "1", "email": "juan@bench.com"}, headers=headers).json()["id"]
+    for i in range(rows):
+        vehicle_id = client.post(f"/clients/{client_id}/vehicles/", json={
+            "license_plate": f"AB{i:03d}CD", "brand": "Ford", "model": "Focus", "year": 2000 + i % 20
+        }, headers=headers).json()["id"]
+        day, hour = divmod(i, 24)
+        client.post(f"/vehicle/{mechanic_id}/{vehicle_id}/repairs/", json={
+            "description": f"Service {i}: cambio de aceite, filtros y revisión de frenos",
+            "start_date": f"2026-01-{day + 1:02d}T{hour:02d}:00:00", "finish_date": f"2026-01-{day + 1:02d}T{hour:02d}:30:00"
+        }, headers=headers)
+
+    urls = {
+        "repairs full": f"/mechanics/{mechanic_id}/repairs/",
+        "repairs fields=id,status,start_date": f"/mechanics/{mechanic_id}/repairs/?fields=id,status,start_date",
+        "vehicles full": f"/vehicles/?q=Juan&limit={rows}",
+        "vehicles fields=id,license_plate": f"/vehicles/?q=Juan&limit={rows}&fields=id,license_plate"
+    }
+    return headers, urls
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+    bodies: dict[str, bytes] = {}
+    with TestClient(app) as client:
+        headers, urls = populate(client, args.rows)
+        print(f"wire bytes and server cpu per request ({args.rows} rows)")
+        for name, url in urls.items():
+            for encoding in encodings:
+                request_headers = {**headers, "Accept-Encoding": encoding}
+                client.get(url, headers=request_headers)
+                # el cliente corre en el mismo proceso, así que la cpu incluye también su parte
+                started = time.process_time()
+                for _ in range(args.runs):
+                    response = client.get(url, headers=request_headers)
+                cpu = (time.process_time() - started) / args.runs * 1000
+                print(f"  {name:36s} {encoding:8s} {response.num_bytes_downloaded:7d} B   {cpu:6.2f} ms")
+            bodies[name] = client.get(url, headers={**headers, "Accept-Encoding": "identity"}).content
+
+    levels = [(f"gzip{level}", lambda body, level=level: gzip.compress(body, level)) for level in (1, 5, 6, 9)]
+    if brotli:
+        levels += [(f"br{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality)) for quality in (1, 4, 6, 11)]
+    print("compression cpu per response")
+    for name, body in bodies.items():
+        print(f"  {name} ({len(body)} B)")
+        for label, compress in levels:
+            runs = 20 if label == "br11" else 200
+            started = time.process_time()
+            for _ in range(runs):
+                compressed = compress(body)
+            print(f"    {label:6s} {len(compressed):7d} B   {(time.process_time() - started) / runs * 1e6:8.0f} us")
+
+if __name__ == "__main__":
+    main()
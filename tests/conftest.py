@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+# la app lee la configuración al importarse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("secret", "test")
+os.environ.setdefault("algorithm", "HS256")
+os.environ.setdefault("MECHANIC_REGISTRATION_CODE", "test")
+os.environ.setdefault("ENTITY_CACHE_BACKEND", "none")
+
+from app.intervals import create_interval_index
+
+@pytest.fixture
+def engine():
+    # base en memoria compartida por todas las sesiones del test
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        create_interval_index(connection)
+    return engine
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date, datetime
+
+from sqlmodel import Session, select
+
+from app.db import save_repair_in_db
+from app.handlers import repair_handler
+from app.handlers.repair_handler import delete_repair, update_info
+from app.handlers.vehicle_handler import update_vehicle
+from app.models import Client, Mechanic, Record, RepairRollup, Repairs, Vehicle
+from app.rollups import create_rollups, rebuild_rollups
+from app.schemas.repairs import RepairsCreate, RepairsUpdate, RepairStatus
+from app.schemas.vehicle import VehicleUpdate
+
+def snapshot(session: Session) -> list[tuple]:
+    rows = session.exec(select(RepairRollup)).all()
+    return sorted(
+        (row.day, row.mechanic_id, row.brand, row.opened, row.finished, row.delivered)
+        for row in rows if (row.opened, row.finished, row.delivered) != (0, 0, 0)
+    )
+
+def assert_matches_rebuild(session: Session):
+    incremental = snapshot(session)
+    rebuild_rollups(session)
+    session.commit()
+    assert incremental == snapshot(session)
+
+def setup_shop(session: Session) -> tuple[Mechanic, Vehicle]:
+    mechanic = Mechanic(name="m", email="m@test.com", password="x", phone="1")
+    client = Client(name="c", phone_number="1", email="c@test.com")
+    session.add_all([mechanic, client])
+    session.commit()
+    vehicle = Vehicle(license_plate="AB123CD", plate_key="AB123CD", brand="Ford", model="Focus", year=2020, client_id=client.id)
+    session.add(vehicle)
+    session.commit()
+    return mechanic, vehicle
+
+def add_legacy_repair(session: Session, mechanic: Mechanic, vehicle: Vehicle, status: RepairStatus) -> Repairs:
+    # como las de antes del historial: estado contado y ningún Record
+    repair = Repairs(description="legacy", status=status, start_date=datetime(2020, 1, 1, 10),
+                     finish_date=datetime(2020, 1, 3, 18), mechanic_id=mechanic.id, vehicle_id=vehicle.id)
+    session.add(repair)
+    session.commit()
+    return repair
+
+def test_incremental_rollups_match_rebuild(engine, session):
+    mechanic, vehicle = setup_shop(session)
+    legacy = add_legacy_repair(session, mechanic, vehicle, RepairStatus.listo)
+    create_rollups(engine)
+    assert_matches_rebuild(session)
+
+    repair = save_repair_in_db(session, RepairsCreate(
+        description="new", start_date=datetime(2030, 1, 1, 10), finish_date=datetime(2030, 1, 1, 12)
+    ), mechanic.id, vehicle.id)
+    assert_matches_rebuild(session)
+
+    asyncio.run(update_info(session, repair.id, RepairsUpdate(description="ok", status=RepairStatus.listo)))
+    assert_matches_rebuild(session)
+    asyncio.run(update_info(session, repair.id, RepairsUpdate(description="ok", status=RepairStatus.entregado)))
+    assert_matches_rebuild(session)
+    asyncio.run(update_info(session, legacy.id, RepairsUpdate(description="ok", status=RepairStatus.entregado)))
+    assert_matches_rebuild(session)
+
+    asyncio.run(update_vehicle(session, vehicle.id, VehicleUpdate(brand="Fiat")))
+    assert_matches_rebuild(session)
+
+    asyncio.run(delete_repair(session, legacy.id))
+    assert_matches_rebuild(session)
+    asyncio.run(delete_repair(session, repair.id))
+    assert_matches_rebuild(session)
+    assert snapshot(session) == []
+
+def test_legacy_repair_leaves_no_counts_after_brand_change_and_delete(engine, session):
+    mechanic, vehicle = setup_shop(session)
+    legacy = add_legacy_repair(session, mechanic, vehicle, RepairStatus.listo)
+    create_rollups(engine)
+    assert [row[2:] for row in snapshot(session)] == [("Ford", 1, 0, 0), ("Ford", 0, 1, 0)]
+
+    asyncio.run(update_vehicle(session, vehicle.id, VehicleUpdate(brand="Fiat")))
+    asyncio.run(delete_repair(session, legacy.id))
+    assert snapshot(session) == []
+
+def test_status_change_is_counted_on_the_shop_day(monkeypatch, session):
+    mechanic, vehicle = setup_shop(session)
+    repair = save_repair_in_db(session, RepairsCreate(
+        description="new", start_date=datetime(2030, 1, 1, 10), finish_date=datetime(2030, 1, 1, 12)
+    ), mechanic.id, vehicle.id)
+    # 22:30 en el taller (UTC-3) ya es el día siguiente en UTC
+    monkeypatch.setattr(repair_handler, "shop_now", lambda: datetime(2030, 1, 1, 22, 30))
+    asyncio.run(update_info(session, repair.id, RepairsUpdate(description="ok", status=RepairStatus.listo)))
+
+    record = session.exec(select(Record).where(Record.repair_id==repair.id)).one()
+    assert record.date == datetime(2030, 1, 1, 22, 30)
+    assert [row[0] for row in snapshot(session) if row[4]] == [date(2030, 1, 1)]